@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 
-from flask import Flask
+import json
+
+from flask import Flask, Response, request, stream_with_context
 
 from flask_graphql import GraphQLView
+from graphene_sqlalchemy.streaming import execute_incremental
 
 from .database import db_session, init_db
 from .schema import schema
@@ -34,6 +37,27 @@ default_query = '''
 app.add_url_rule('/graphql', view_func=GraphQLView.as_view('graphql', schema=schema, graphiql=True))
 
 
+@app.route('/graphql/stream', methods=['POST'])
+def graphql_stream():
+    # Sends the edges marked with @stream as the parts of a chunked
+    # multipart response, as they are read from the database
+    data = request.get_json()
+    payloads = execute_incremental(
+        schema, data['query'],
+        context_value={'session': db_session},
+        variable_values=data.get('variables'),
+        operation_name=data.get('operationName'))
+
+    def multipart():
+        for payload in payloads:
+            yield '\r\n---\r\nContent-Type: application/json; charset=utf-8' \
+                  '\r\n\r\n' + json.dumps(payload)
+        yield '\r\n-----\r\n'
+
+    return Response(stream_with_context(multipart()),
+                    mimetype='multipart/mixed; boundary="-"')
+
+
 @app.teardown_appcontext
 def shutdown_session(exception=None):
     db_session.remove()
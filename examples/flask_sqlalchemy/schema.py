@@ -2,6 +2,7 @@ import graphene
 from graphene import relay
 from graphene_sqlalchemy import (SQLAlchemyConnectionField,
                                  SQLAlchemyObjectType, utils)
+from graphene_sqlalchemy.streaming import STREAM_DIRECTIVES
 
 from .models import Department as DepartmentModel
 from .models import Employee as EmployeeModel
@@ -44,4 +45,5 @@ class Query(graphene.ObjectType):
     all_departments = SQLAlchemyConnectionField(Department, sort=None)
 
 
-schema = graphene.Schema(query=Query, types=[Department, Employee, Role])
+schema = graphene.Schema(query=Query, types=[Department, Employee, Role],
+                         directives=STREAM_DIRECTIVES)
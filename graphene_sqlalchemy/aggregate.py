@@ -0,0 +1,259 @@
+import graphene
+from sqlalchemy import func
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm.query import Query
+
+from .aio import execute, is_async_session
+from .records import RecordQuery
+from .sharding import fan_out
+from .utils import get_selection_names, get_selection_set, get_session
+
+AGGREGATE_FUNCTIONS = {
+    'sum': func.sum,
+    'avg': func.avg,
+    'min': func.min,
+    'max': func.max,
+}
+
+# Cache for the generated types, to avoid name clash
+_TYPE_CACHE = {}
+
+
+def get_numeric_columns(model, registry):
+    """Returns the columns of a model converted to `Int` or `Float`,
+    primary keys are converted to `ID` and skipped"""
+    from .converter import convert_sqlalchemy_type
+    columns = {}
+    for column in inspect(model).columns:
+        try:
+            converted = convert_sqlalchemy_type(
+                column.type, column, column.name, registry)
+        except Exception:
+            continue
+        if isinstance(converted, (graphene.Int, graphene.Float)):
+            columns[column.key] = type(converted)
+    return columns
+
+
+def create_aggregate_type(model, name, registry):
+    """Builds the `<name>Aggregate` type exposing `count` and, for numeric
+    columns, `sum`, `avg`, `min` and `max`"""
+    if f'{name}Aggregate' in _TYPE_CACHE:
+        return _TYPE_CACHE[f'{name}Aggregate']
+    columns = get_numeric_columns(model, registry)
+    fields = {'count': graphene.Int(required=True)}
+    if columns:
+        float_columns = type(f'{name}AggregateFloatColumns',
+                             (graphene.ObjectType,),
+                             {n: graphene.Float(name=n) for n in columns})
+        value_columns = type(f'{name}AggregateColumns',
+                             (graphene.ObjectType,),
+                             {n: t(name=n) for n, t in columns.items()})
+        fields.update(
+            sum=graphene.Field(float_columns),
+            avg=graphene.Field(float_columns),
+            min=graphene.Field(value_columns),
+            max=graphene.Field(value_columns))
+    aggregate_type = type(f'{name}Aggregate', (graphene.ObjectType,), fields)
+    _TYPE_CACHE[f'{name}Aggregate'] = aggregate_type
+    return aggregate_type
+
+
+def requested_aggregates(selection_set, fragments=None):
+    """Returns the (function, column) pairs requested in the selection set
+    of an aggregate field"""
+    requested = []
+    for name in get_selection_names(selection_set, fragments):
+        if name == 'count':
+            requested.append(('count', None))
+        elif name in AGGREGATE_FUNCTIONS:
+            columns = get_selection_set(selection_set, name, fragments)
+            requested.extend(
+                (name, c) for c in get_selection_names(columns, fragments)
+                if c != '__typename')
+    return requested
+
+
+def _aggregate_expressions(model, requested):
+    expressions = []
+    for fn, column in requested:
+        if fn == 'count':
+            expressions.append(func.count())
+        else:
+            expressions.append(
+                AGGREGATE_FUNCTIONS[fn](getattr(model, column)))
+    return expressions
+
+
+def _aggregate_result(requested, values):
+    result = {fn: {} for fn in AGGREGATE_FUNCTIONS}
+    for (fn, column), value in zip(requested, values):
+        if fn == 'count':
+            result['count'] = value
+        else:
+            result[fn][column] = value
+    return result
+
+
+def _aggregate_list(items, requested):
+    result = {fn: {} for fn in AGGREGATE_FUNCTIONS}
+    for fn, column in requested:
+        if fn == 'count':
+            result['count'] = len(items)
+            continue
+        values = [getattr(i, column) for i in items
+                  if getattr(i, column) is not None]
+        if not values:
+            value = None
+        elif fn == 'sum':
+            value = sum(values)
+        elif fn == 'avg':
+            value = sum(values) / len(values)
+        else:
+            value = min(values) if fn == 'min' else max(values)
+        result[fn][column] = value
+    return result
+
+
+def _aggregate_statement(query, model, requested):
+    return query.order_by(None).limit(None).offset(None) \
+        .with_entities(*_aggregate_expressions(model, requested))
+
+
+def aggregate_query(query, model, requested):
+    """Computes every requested aggregate over `query` in one statement"""
+    if not requested:
+        return _aggregate_result(requested, ())
+    row = _aggregate_statement(query, model, requested).one()
+    return _aggregate_result(requested, row)
+
+
+async def aggregate_query_async(session, query, model, requested):
+    """Same as `aggregate_query`, executed by an AsyncSession"""
+    if not requested:
+        return _aggregate_result(requested, ())
+    result = await execute(
+        session, _aggregate_statement(query, model, requested))
+    return _aggregate_result(requested, result.one())
+
+
+class ShardQueries(list):
+    """Unsliced queries of the shards merged by a connection"""
+
+
+def _shard_expressions(model, requested):
+    expressions = []
+    for fn, column in requested:
+        if fn == 'avg':
+            # Averages are combined from the sums and counts of the shards
+            column = getattr(model, column)
+            expressions.extend((func.sum(column), func.count(column)))
+        else:
+            expressions.extend(_aggregate_expressions(model, [(fn, column)]))
+    return expressions
+
+
+def aggregate_shards(queries, model, requested):
+    """Computes the aggregates on every shard in parallel and combines
+    them"""
+    if not requested:
+        return _aggregate_result(requested, ())
+    expressions = _shard_expressions(model, requested)
+    rows = fan_out(
+        lambda query: query.order_by(None).limit(None).offset(None)
+        .with_entities(*expressions).one(), queries)
+    values = []
+    columns = iter(zip(*rows))
+    for fn, _ in requested:
+        shard_values = [v for v in next(columns) if v is not None]
+        if fn == 'count':
+            value = sum(shard_values)
+        elif fn == 'avg':
+            count = sum(next(columns))
+            value = sum(shard_values) / count if count else None
+        elif not shard_values:
+            value = None
+        else:
+            value = {'sum': sum, 'min': min, 'max': max}[fn](shard_values)
+        values.append(value)
+    return _aggregate_result(requested, values)
+
+
+def resolve_aggregate(model, root, info):
+    field_ast = next(iter(info.field_asts), None)
+    requested = requested_aggregates(
+        getattr(field_ast, 'selection_set', None), info.fragments)
+    iterable = getattr(root, 'iterable', None)
+    if isinstance(iterable, RecordQuery):
+        # Read-only connections aggregate the query of their records
+        iterable = iterable.query
+    if isinstance(iterable, ShardQueries):
+        return aggregate_shards(iterable, model, requested)
+    if isinstance(iterable, Query):
+        session = get_session(info.context)
+        if is_async_session(session):
+            return aggregate_query_async(session, iterable, model, requested)
+        return aggregate_query(iterable, model, requested)
+    return _aggregate_list(list(iterable or []), requested)
+
+
+def create_group_type(model, name, registry):
+    """Builds the `<name>Group` type of a bucket, exposing the values of
+    the grouped columns in `key` and the bucket aggregates in `aggregate`"""
+    if f'{name}Group' in _TYPE_CACHE:
+        return _TYPE_CACHE[f'{name}Group']
+    from .converter import convert_sqlalchemy_type
+    key_fields = {}
+    for column in inspect(model).columns:
+        try:
+            converted = convert_sqlalchemy_type(
+                column.type, column, column.name, registry,
+                optional_field=True)
+        except Exception:
+            continue
+        key_fields[column.key] = converted
+    key_type = type(f'{name}GroupKey', (graphene.ObjectType,), key_fields)
+    group_type = type(f'{name}Group', (graphene.ObjectType,), {
+        'key': graphene.Field(key_type, required=True),
+        'aggregate': graphene.Field(
+            create_aggregate_type(model, name, registry), required=True),
+    })
+    _TYPE_CACHE[f'{name}Group'] = group_type
+    return group_type
+
+
+class GroupedQuery(object):
+    """Sequence over the buckets of `query` grouped by `group_by`.
+    Slicing runs one GROUP BY statement limited to the requested page"""
+
+    def __init__(self, query, model, group_by, requested):
+        self.model = model
+        self.group_by = list(group_by)
+        self.requested = requested
+        columns = [c.value for c in self.group_by]
+        self.query = query.order_by(None) \
+            .with_entities(*columns,
+                           *_aggregate_expressions(model, requested)) \
+            .group_by(*columns) \
+            .order_by(*columns)
+        self._len = None
+
+    def __len__(self):
+        if self._len is None:
+            self._len = self.query.order_by(None).count()
+        return self._len
+
+    def __getitem__(self, item):
+        assert isinstance(item, slice), 'Buckets can only be sliced'
+        return [self._to_group(row) for row in self.query[item]]
+
+    def __iter__(self):
+        return (self._to_group(row) for row in self.query)
+
+    def _to_group(self, row):
+        size = len(self.group_by)
+        key = {c.value.key: v for c, v in zip(self.group_by, row[:size])}
+        return {
+            'key': key,
+            'aggregate': _aggregate_result(self.requested, row[size:]),
+        }
@@ -0,0 +1,159 @@
+import asyncio
+from functools import partial
+from inspect import isawaitable
+from sqlalchemy import func, select
+from sqlalchemy.orm.query import Query
+
+from .loaders import (get_loader, get_parent_key, get_relationship_columns,
+                      get_relationship_key_columns)
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession
+except ImportError:
+    # Added in SQLAlchemy 1.4
+    AsyncSession = None
+
+# Key of the lock serializing the statements of an AsyncSession, which
+# doesn't allow concurrent operations, in its `info`
+SESSION_LOCK_INFO_KEY = '_graphene_sqlalchemy_lock'
+
+
+def is_async_session(session):
+    return AsyncSession is not None and isinstance(session, AsyncSession)
+
+
+def _get_lock(session):
+    info = session.sync_session.info
+    if SESSION_LOCK_INFO_KEY not in info:
+        info[SESSION_LOCK_INFO_KEY] = asyncio.Lock()
+    return info[SESSION_LOCK_INFO_KEY]
+
+
+def _statement(query):
+    return query.statement if isinstance(query, Query) else query
+
+
+async def execute(session, statement, params=None):
+    async with _get_lock(session):
+        return await session.execute(_statement(statement), params)
+
+
+async def fetch_all(session, query, params=None):
+    result = await execute(session, query, params)
+    return result.scalars().all()
+
+
+async def fetch_first(session, query, params=None):
+    result = await execute(session, query, params)
+    return result.scalars().first()
+
+
+async def fetch_count(session, query):
+    statement = select([func.count()]).select_from(
+        _statement(query.order_by(None)).subquery())
+    result = await execute(session, statement)
+    return result.scalar()
+
+
+async def fetch_get(session, model, id):
+    async with _get_lock(session):
+        return await session.get(model, id)
+
+
+async def run_sync(session, fn):
+    """Runs `fn` with the synchronous session proxied by `session`, lazy
+    loads and commits inside it are awaited on the event loop"""
+    async with _get_lock(session):
+        return await session.run_sync(fn)
+
+
+async def resolve_awaitable(value, fn):
+    if isawaitable(value):
+        value = await value
+    result = fn(value)
+    if isawaitable(result):
+        result = await result
+    return result
+
+
+class AsyncDataLoader(object):
+    """Batches the keys loaded in one pass of the event loop into a single
+    call of the coroutine `batch_load_fn(keys)`, which returns the values
+    in the order of the keys"""
+
+    def __init__(self, batch_load_fn):
+        self.batch_load_fn = batch_load_fn
+        self._futures = {}
+        self._queue = []
+
+    def load(self, key):
+        if key in self._futures:
+            return self._futures[key]
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._futures[key] = future
+        self._queue.append((key, future))
+        if len(self._queue) == 1:
+            loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        return future
+
+    async def _dispatch(self):
+        queue, self._queue = self._queue, []
+        try:
+            values = await self.batch_load_fn([k for k, _ in queue])
+        except Exception as e:
+            for key, future in queue:
+                del self._futures[key]
+                future.set_exception(e)
+            return
+        for (key, future), value in zip(queue, values):
+            future.set_result(value)
+
+
+async def load_relationships(relationship, session, keys):
+    parent_column, key_column = get_relationship_columns(relationship)
+    statement = select([key_column, relationship.mapper.entity])
+    if relationship.secondary is not None:
+        pairs = relationship.secondary_synchronize_pairs
+        assert len(pairs) == 1, \
+            f'Relationship {relationship} must be joined by a single column'
+        target_column, secondary_column = pairs[0]
+        statement = statement.select_from(relationship.mapper.entity) \
+            .join(relationship.secondary, target_column == secondary_column)
+    statement = statement.where(key_column.in_(set(keys)))
+    if relationship.order_by:
+        statement = statement.order_by(*relationship.order_by)
+    related = {}
+    for key, model in (await execute(session, statement)).all():
+        related.setdefault(key, []).append(model)
+    if relationship.uselist:
+        return [related.get(k, []) for k in keys]
+    return [next(iter(related.get(k, [])), None) for k in keys]
+
+
+async def load_relationship_counts(relationship, session, keys):
+    _, foreign_column = get_relationship_key_columns(relationship)
+    statement = select([foreign_column, func.count()]) \
+        .where(foreign_column.in_(set(keys))) \
+        .group_by(foreign_column)
+    counts = dict((await execute(session, statement)).all())
+    return [counts.get(k, 0) for k in keys]
+
+
+def load_relationship(relationship, session, context, root):
+    key = get_parent_key(relationship, root)
+    if key is None:
+        return [] if relationship.uselist else None
+    loader = get_loader(
+        context, ('async', relationship),
+        lambda: AsyncDataLoader(
+            partial(load_relationships, relationship, session)))
+    return loader.load(key)
+
+
+def load_relationship_count(relationship, session, context, key):
+    loader = get_loader(
+        context, ('async_count', relationship),
+        lambda: AsyncDataLoader(
+            partial(load_relationship_counts, relationship, session)))
+    return loader.load(key)
@@ -4,6 +4,7 @@ import graphene
 import sqlalchemy
 import sqlalchemy_utils
 from collections import OrderedDict
+from functools import partial
 from graphene.types.utils import yank_fields_from_attrs
 from sqlalchemy import inspect
 from sqlalchemy.dialects import postgresql
@@ -13,6 +14,7 @@ from sqlalchemy.orm.base import object_mapper
 from sqlalchemy.sql import type_api
 
 from .fields import default_connection_field_factory
+from .loaders import resolve_relationship_count
 from .registry import Registry, get_global_registry
 from .utils import (get_column_doc, is_column_required, is_column_nullable,
                     is_mapped_class, get_model_primary_key)
@@ -79,7 +81,8 @@ def construct_fields(
         field_types=(),
         type_cast=None,
         connection_field_factory=None,
-        input_attributes=False):
+        input_attributes=False,
+        relationship_counts=()):
     fields = OrderedDict()
     type_cast = type_cast or dict()
     relationship_keys = list()
@@ -124,6 +127,13 @@ def construct_fields(
         if not converted_field:
             continue
         fields[name] = converted_field
+
+        if type is FieldType.relationship and not input_attributes and (
+                relationship_counts is True or name in relationship_counts):
+            count_field = convert_sqlalchemy_relationship_count(
+                field, name, registry)
+            if count_field:
+                fields[f'{name}_count'] = count_field
     return fields
 
 
@@ -135,7 +145,8 @@ def get_attributes_fields(
         exclude_fields=(),
         type_cast=None,
         connection_field_factory=None,
-        input_attributes=False):
+        input_attributes=False,
+        relationship_counts=()):
     _fields = yank_fields_from_attrs(construct_fields(
         models,
         registry,
@@ -144,7 +155,8 @@ def get_attributes_fields(
         exclude_fields=exclude_fields,
         type_cast=type_cast,
         connection_field_factory=connection_field_factory,
-        input_attributes=input_attributes
+        input_attributes=input_attributes,
+        relationship_counts=relationship_counts
     ), _as=graphene.Field)
     return _fields
 
@@ -261,6 +273,8 @@ def convert_sqlalchemy_relationship(t, relationship, name,
 
     if not input_attributes:
         def dynamic_type():
+            # Resolved by the default resolver of the ObjectType, so a
+            # resolve_<name> method of the type takes precedence
             _type = registry.get_type_for_model(model)
             if not _type:
                 return None
@@ -299,6 +313,16 @@ def convert_sqlalchemy_relationship(t, relationship, name,
         required=is_column_required(relationship, input_attributes))
 
 
+def convert_sqlalchemy_relationship_count(relationship, name, registry=None):
+    if relationship.direction not in (interfaces.ONETOMANY,
+                                      interfaces.MANYTOMANY):
+        return None
+    return graphene.Int(
+        description=f'Number of {name}',
+        required=True,
+        resolver=partial(resolve_relationship_count, relationship))
+
+
 def convert_sqlalchemy_hybrid_method(t, f, name,
                                      registry=None,
                                      connection_field_factory=None,
@@ -0,0 +1,113 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from inspect import isclass
+from promise import Promise
+
+from .fields import UnsortedConnectionField
+from .relay import Node
+from .session import copy_info_with_session
+
+# Every parallel field holds a pooled connection, the default stays below
+# the default pool size of an engine
+DEFAULT_MAX_WORKERS = 4
+
+
+def _field_owner(resolve_fn):
+    while isinstance(resolve_fn, partial):
+        owner = getattr(resolve_fn.func, '__self__', None)
+        if owner is not None:
+            return owner
+        resolve_fn = resolve_fn.func
+    return None
+
+
+def is_parallel_field(resolve_fn, info):
+    """Root fields of a query resolved by a ConnectionField or a Node
+    field, they don't depend on each other"""
+    if info.operation.operation != 'query' or len(info.path or ()) != 1:
+        return False
+    owner = _field_owner(resolve_fn)
+    return isinstance(owner, UnsortedConnectionField) or \
+        (isclass(owner) and issubclass(owner, Node))
+
+
+class _Execution(object):
+    """Futures and sessions of the parallel fields of one operation"""
+
+    def __init__(self):
+        self.pending = []
+        self.sessions = []
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+        self.sessions = []
+
+
+class ParallelExecutor(object):
+    """graphql-core executor resolving the independent root fields of a
+    query concurrently on a bounded thread pool. Each of them gets its
+    own session from `session_factory` in a copy of the context, the
+    sessions are closed once the operation is resolved. Every other field
+    is resolved synchronously on the calling thread.
+
+    An operation is executed on its calling thread, so the executor keeps
+    the state of each one in a thread local and can be shared by
+    concurrent requests. The fields are only completed by
+    `wait_until_finished`, operations can't be executed with
+    `return_promise`. `shutdown` stops the thread pool::
+
+        executor = ParallelExecutor(Session)
+        result = schema.execute(query, context_value=context,
+                                executor=executor)
+    """
+
+    def __init__(self, session_factory, max_workers=DEFAULT_MAX_WORKERS):
+        self.session_factory = session_factory
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='graphene_sqlalchemy')
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+    def execute(self, fn, *args, **kwargs):
+        source, info = args[:2]
+        if not is_parallel_field(fn, info):
+            return fn(*args, **kwargs)
+        execution = getattr(self._local, 'execution', None)
+        if execution is None:
+            execution = self._local.execution = _Execution()
+        session = self.session_factory()
+        execution.sessions.append(session)
+        info = copy_info_with_session(info, session)
+        future = self.pool.submit(fn, source, info, *args[2:], **kwargs)
+        promise = Promise()
+        execution.pending.append((future, promise))
+        return promise
+
+    def wait_until_finished(self):
+        # Results are resolved on the calling thread, so the sub-fields
+        # of every root field are completed there
+        execution = getattr(self._local, 'execution', None)
+        if execution is None:
+            return
+        try:
+            while execution.pending:
+                pending, execution.pending = execution.pending, []
+                for future, promise in pending:
+                    try:
+                        promise.do_resolve(future.result())
+                    except Exception as e:
+                        promise.do_reject(e)
+        finally:
+            self._local.execution = None
+            execution.close()
@@ -2,14 +2,43 @@ import graphene
 from functools import partial
 from graphene.relay import Connection
 from graphene.relay.connection import PageInfo
-from graphql_relay.connection.arrayconnection import connection_from_list_slice
+from graphql_relay.connection.arrayconnection import (
+    connection_from_list_slice, get_offset_with_default, offset_to_cursor)
+from itertools import islice
 from promise import Promise, is_thenable
 from sqlalchemy.orm.query import Query
 
-from .utils import get_query, sort_argument_for_model
+from .aio import (fetch_all, fetch_count, is_async_session,
+                  resolve_awaitable)
+from .aggregate import (create_group_type, GroupedQuery, requested_aggregates,
+                        ShardQueries)
+from .records import get_node_selection_names, get_record_columns, RecordQuery
+from .search import apply_search
+from .sharding import (count_shards, get_shard_config, get_shard_infos,
+                       merge_shards, sort_columns)
+from .statements import resolver_type
+from .streaming import get_stream_arguments, register_stream
+from .utils import (get_query, get_session, get_selection_set, group_by_argument_for_model,
+                    sort_argument_for_model)
+
+
+class _SliceBounds(object):
+
+    def __getitem__(self, item):
+        self.start, self.stop = item.start, item.stop
+        return []
 
 
 class UnsortedConnectionField(graphene.relay.ConnectionField):
+    # Whether the rows of the shards of a sharded model can be merged
+    shardable = True
+
+    def __init__(self, type, *args, read_only=False, **kwargs):
+        # Read-only connections resolve their nodes from records of the
+        # selected columns instead of ORM instances
+        self.read_only = read_only
+        super().__init__(type, *args, **kwargs)
+
     @property
     def type(self):
         from .types import ObjectType
@@ -28,20 +57,56 @@ class UnsortedConnectionField(graphene.relay.ConnectionField):
     def model(self):
         return self.type._meta.node._meta.model
 
-    def get_query(self, model, info, sort=None, **args):
-        query = get_query(model, info.context)
-        if sort is not None:
-            if isinstance(sort, str):
-                query = query.order_by(sort.value)
-            else:
-                query = query.order_by(*(col.value for col in sort))
+    @property
+    def search_fields(self):
+        return self.type._meta.node._meta.search_fields
+
+    def get_query(self, model, info, **args):
+        query, _ = self.get_ordered_query(model, info, **args)
         return query
 
+    def get_ordered_query(self, model, info, sort=None, search=None,
+                          **args):
+        """Returns the query and the expressions ordering it"""
+        query = get_query(model, info.context)
+        if isinstance(sort, str):
+            sort = [sort]
+        query, sort = apply_search(
+            query, model, self.search_fields, search, sort)
+        order_by = [col.value for col in sort]
+        if order_by:
+            query = query.order_by(*order_by)
+        return query, order_by
+
     def resolve_connection(self, connection_type, model, info, args, resolved):
+        with resolver_type('connection'):
+            return self._resolve_connection(
+                connection_type, model, info, args, resolved)
+
+    def _resolve_connection(self, connection_type, model, info, args,
+                            resolved):
+        shards = None
+        if resolved is None and self.shardable:
+            shards = get_shard_config(
+                self.type._meta.node._meta.registry, model, info.context)
+        if shards is not None:
+            return self._resolve_sharded_connection(
+                connection_type, model, info, args, shards)
         if resolved is None:
             resolved = self.get_query(model, info, **args)
+        session = get_session(info.context)
+        if isinstance(resolved, Query) and is_async_session(session):
+            return self._resolve_connection_async(
+                connection_type, info, args, resolved, session)
+        stream = get_stream_arguments(info)
+        if isinstance(resolved, Query) and stream is not None:
+            return self._resolve_streamed_connection(
+                connection_type, model, info, args, resolved, *stream)
+        if isinstance(resolved, Query) and self.read_only:
+            resolved = RecordQuery(resolved, model, get_record_columns(
+                model, get_node_selection_names(info)))
         if isinstance(resolved, Query):
-            _len = resolved.count()
+            _len = resolved.order_by(None).count()
         else:
             _len = len(resolved)
         connection = connection_from_list_slice(resolved, args,
@@ -55,12 +120,111 @@ class UnsortedConnectionField(graphene.relay.ConnectionField):
         connection.length = _len
         return connection
 
+    def _resolve_streamed_connection(self, connection_type, model, info,
+                                     args, resolved, edges_ast,
+                                     initial_count, batch_size):
+        _len = resolved.order_by(None).count()
+        bounds = _SliceBounds()
+        connection = connection_from_list_slice(bounds, args,
+                                                slice_start=0,
+                                                list_length=_len,
+                                                list_slice_length=_len,
+                                                connection_type=connection_type,
+                                                pageinfo_type=PageInfo,
+                                                edge_type=connection_type.Edge)
+        start, stop = bounds.start, bounds.stop
+        # The page is read from a server side cursor while it is sent
+        if self.read_only:
+            nodes = RecordQuery(resolved, model, get_record_columns(
+                model, get_node_selection_names(info))).iterate(
+                start, stop, batch_size)
+        else:
+            nodes = iter(resolved.slice(start, stop).yield_per(batch_size))
+        initial = list(islice(nodes, initial_count))
+        connection.edges = [
+            connection_type.Edge(node=node, cursor=offset_to_cursor(i))
+            for i, node in enumerate(initial, start)]
+        if stop > start:
+            connection.page_info.start_cursor = offset_to_cursor(start)
+            connection.page_info.end_cursor = offset_to_cursor(stop - 1)
+        register_stream(info, connection_type, edges_ast, nodes, start,
+                        len(initial), batch_size)
+        connection.length = _len
+        return connection
+
+    async def _resolve_connection_async(self, connection_type, info, args,
+                                        resolved, session):
+        _len = await fetch_count(session, resolved)
+        # Records the bounds of the page without loading it
+        bounds = _SliceBounds()
+        connection_from_list_slice(bounds, args,
+                                   slice_start=0,
+                                   list_length=_len,
+                                   list_slice_length=_len,
+                                   connection_type=connection_type,
+                                   pageinfo_type=PageInfo,
+                                   edge_type=connection_type.Edge)
+        items = await fetch_all(
+            session, resolved.slice(bounds.start, bounds.stop))
+        connection = connection_from_list_slice(items, args,
+                                                slice_start=bounds.start,
+                                                list_length=_len,
+                                                list_slice_length=len(items),
+                                                connection_type=connection_type,
+                                                pageinfo_type=PageInfo,
+                                                edge_type=connection_type.Edge)
+        # The aggregates run over the whole query, not the page
+        connection.iterable = resolved
+        connection.length = _len
+        return connection
+
+    def _resolve_sharded_connection(self, connection_type, model, info,
+                                    args, shards):
+        queries = []
+        for shard_info in get_shard_infos(info, shards):
+            query, order_by = self.get_ordered_query(
+                model, shard_info, **args)
+            queries.append(query)
+        columns, descending = sort_columns(model, order_by)
+        first = args.get('first')
+        if isinstance(first, int) and args.get('last') is None and \
+                args.get('before') is None:
+            # The page only spans the first rows of every shard
+            stop = get_offset_with_default(args.get('after'), -1) + 1 + first
+            items, _len = merge_shards(
+                queries, columns, descending, stop=stop, count=True)
+        else:
+            _len = count_shards(queries)
+            bounds = _SliceBounds()
+            connection_from_list_slice(bounds, args,
+                                       slice_start=0,
+                                       list_length=_len,
+                                       list_slice_length=_len,
+                                       connection_type=connection_type,
+                                       pageinfo_type=PageInfo,
+                                       edge_type=connection_type.Edge)
+            items, _ = merge_shards(
+                queries, columns, descending, stop=bounds.stop)
+        connection = connection_from_list_slice(items, args,
+                                                slice_start=0,
+                                                list_length=_len,
+                                                list_slice_length=len(items),
+                                                connection_type=connection_type,
+                                                pageinfo_type=PageInfo,
+                                                edge_type=connection_type.Edge)
+        connection.iterable = ShardQueries(queries)
+        connection.length = _len
+        return connection
+
     def connection_resolver(self, resolver, connection_type, model, root,
                             info, **args):
         resolved = resolver(root, info, **args)
         on_resolve = partial(
             self.resolve_connection, connection_type, model, info, args)
 
+        if is_async_session(get_session(info.context)):
+            return resolve_awaitable(resolved, on_resolve)
+
         if is_thenable(resolved):
             return Promise.resolve(resolved).then(on_resolve)
 
@@ -68,18 +232,33 @@ class UnsortedConnectionField(graphene.relay.ConnectionField):
 
     def get_resolver(self, parent_resolver):
         return partial(self.connection_resolver,
-                       parent_resolver,
+                       parent_resolver or self.resolver,
                        self.type,
                        self.model)
 
 
 class ConnectionField(UnsortedConnectionField):
     def __init__(self, type, *args, **kwargs):
+        search_fields = None
+        related_sort = False
+        indexed_fields = None
+        if issubclass(type, Connection):
+            node_meta = type.Edge.node._type._meta
+            search_fields = getattr(node_meta, 'search_fields', None)
+            indexed_fields = getattr(node_meta, 'indexed_fields', None)
+            # Subqueries over related tables can't use the indexes of
+            # the model table, so they are left out in index aware mode
+            related_sort = getattr(node_meta, 'related_sort', False) and \
+                indexed_fields is None
+            if search_fields:
+                kwargs.setdefault("search", graphene.String())
         if "sort" not in kwargs and issubclass(type, Connection):
             # Let super class raise if type is not a Connection
             try:
                 model = type.Edge.node._type._meta.model
-                kwargs.setdefault("sort", sort_argument_for_model(model))
+                kwargs.setdefault("sort", sort_argument_for_model(
+                    model, relevance=bool(search_fields),
+                    related=related_sort, only_columns=indexed_fields))
             except Exception:
                 raise Exception(
                     'Cannot create sort argument for {}. A model is required. '
@@ -91,6 +270,46 @@ class ConnectionField(UnsortedConnectionField):
         super().__init__(type, *args, **kwargs)
 
 
+class GroupByConnectionField(UnsortedConnectionField):
+    """Connection over the buckets of a `GROUP BY` on the columns given
+    in the `groupBy` argument, with the aggregates of every bucket"""
+    shardable = False
+
+    def __init__(self, type, *args, **kwargs):
+        from .types import ObjectType
+        assert issubclass(type, ObjectType), f'{self.__class__.__name__} ' \
+            f'only accepts {ObjectType.__name__} types, ' \
+            f'not {type.__name__}'
+        self.node_type = type
+        model = type._meta.model
+        group_type = create_group_type(
+            model, type.__name__, type._meta.registry)
+        kwargs.setdefault("group_by", group_by_argument_for_model(model))
+        if type._meta.search_fields:
+            kwargs.setdefault("search", graphene.String())
+        connection = graphene.relay.Connection.create_type(
+            f'{type.__name__}GroupConnection', node=group_type)
+        super().__init__(connection, *args, **kwargs)
+
+    @property
+    def model(self):
+        return self.node_type._meta.model
+
+    @property
+    def search_fields(self):
+        return self.node_type._meta.search_fields
+
+    def get_query(self, model, info, group_by=None, **args):
+        query = super().get_query(model, info, **args)
+        selection_set = getattr(
+            next(iter(info.field_asts), None), 'selection_set', None)
+        for name in ('edges', 'node', 'aggregate'):
+            selection_set = get_selection_set(
+                selection_set, name, info.fragments)
+        requested = requested_aggregates(selection_set, info.fragments)
+        return GroupedQuery(query, model, group_by, requested)
+
+
 def default_connection_field_factory(relationship, registry):
     model = relationship.mapper.entity
     model_type = registry.get_type_for_model(model)
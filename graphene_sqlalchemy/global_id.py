@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+import re
+
+# Marks the compact ids, it is outside of both base64 alphabets
+COMPACT_PREFIX = '~'
+
+_BASE64_DATA = re.compile(r'[A-Za-z0-9+/]*')
+_URLSAFE_BASE64_DATA = re.compile(r'[A-Za-z0-9_-]*')
+_TO_URLSAFE = bytes.maketrans(b'+/', b'-_')
+_FROM_URLSAFE = bytes.maketrans(b'-_', b'+/')
+
+
+def _encode_varint(value, data):
+    while value > 0x7f:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _decode_varint(data, position):
+    """Returns the varint at `position` and the position after it, None
+    when the data ends in the middle of it"""
+    value = 0
+    shift = 0
+    while position < len(data):
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+    return None, position
+
+
+class GlobalIDCodec(object):
+    """Encodes and decodes the global ids of the nodes.
+
+    The standard format is the base64 of "Type:id" of graphql_relay, the
+    base64 of the whole 3 byte groups of every "Type:" prefix is computed
+    once. Composite keys are encoded as a JSON array of their values.
+    With `compact`, the ids of the types listed in `types` with a
+    non negative integer key are the varints of the index of the type
+    and of the key in url safe base64, after "~". The position of a type
+    in `types` is part of its ids, new types are appended. Both formats
+    are decoded whatever `compact` is.
+    """
+
+    def __init__(self, types=(), compact=False):
+        self.types = list(types)
+        self.type_indexes = {name: i for i, name in enumerate(self.types)}
+        self.compact = compact
+        self._prefixes = {}
+
+    def _get_prefix(self, type_name):
+        prefix = self._prefixes.get(type_name)
+        if prefix is None:
+            raw = f'{type_name}:'.encode('utf-8')
+            split = len(raw) - len(raw) % 3
+            prefix = (base64.b64encode(raw[:split]).decode('ascii'),
+                      raw[split:])
+            self._prefixes[type_name] = prefix
+        return prefix
+
+    def encode(self, type_name, id):
+        if self.compact and type(id) is int and id >= 0 and \
+                type_name in self.type_indexes:
+            data = bytearray()
+            _encode_varint(self.type_indexes[type_name], data)
+            _encode_varint(id, data)
+            return COMPACT_PREFIX + binascii.b2a_base64(
+                data, newline=False).rstrip(b'=') \
+                .translate(_TO_URLSAFE).decode('ascii')
+        if type(id) is tuple:
+            id = encode_composite_key(id)
+        encoded, rest = self._get_prefix(type_name)
+        return encoded + binascii.b2a_base64(
+            rest + str(id).encode('utf-8'), newline=False).decode('ascii')
+
+    def decode(self, global_id):
+        """Returns the type name and the id of `global_id`, None when it
+        isn't a global id. The type name of a compact id of a type this
+        codec doesn't list is None"""
+        if global_id.__class__ is not str:
+            return None
+        if global_id[:1] == COMPACT_PREFIX:
+            return self._decode_compact(global_id[1:])
+        # Validated up front, binascii raises on malformed base64
+        data = global_id.rstrip('=')
+        if len(global_id) % 4 or len(global_id) - len(data) > 2 or \
+                not data.isascii() or \
+                not (data.isalnum() or _BASE64_DATA.fullmatch(data)):
+            return None
+        type_name, separator, id = binascii.a2b_base64(global_id) \
+            .decode('utf-8', 'replace').partition(':')
+        if not separator:
+            return None
+        return type_name, id
+
+    def _decode_compact(self, encoded):
+        if len(encoded) % 4 == 1 or not encoded.isascii() or \
+                not (encoded.isalnum() or
+                     _URLSAFE_BASE64_DATA.fullmatch(encoded)):
+            return None
+        data = binascii.a2b_base64(
+            (encoded + '=' * (-len(encoded) % 4)).encode('ascii')
+            .translate(_FROM_URLSAFE))
+        index, position = _decode_varint(data, 0)
+        if index is None:
+            return None
+        id, position = _decode_varint(data, position)
+        if id is None or position != len(data):
+            return None
+        type_name = self.types[index] if index < len(self.types) else None
+        return type_name, id
+
+
+def encode_composite_key(key):
+    return json.dumps(list(key), separators=(',', ':'), default=str)
+
+
+def decode_composite_key(id, size):
+    """Returns the tuple of the `size` values of a composite key encoded
+    in a global id, None when `id` isn't one"""
+    if isinstance(id, tuple):
+        return id if len(id) == size else None
+    if not isinstance(id, str) or not id.startswith('['):
+        return None
+    try:
+        values = json.loads(id)
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != size or \
+            any(isinstance(v, (list, dict)) for v in values):
+        return None
+    return tuple(values)
+
+
+default_global_id_codec = GlobalIDCodec()
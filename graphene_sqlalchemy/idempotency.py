@@ -0,0 +1,205 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import partial
+from sqlalchemy import (Boolean, Column, DateTime, MetaData, PickleType,
+                        String, Table, func)
+from sqlalchemy.exc import IntegrityError
+
+# Returned by `IdempotencyStore.get` when nothing is stored for a key
+MISSING = object()
+
+
+class IdempotencyStore(ABC):
+    """Stores the result of a mutation under its idempotency key.
+    `run` executes the mutation once per key, a duplicate waits for the
+    first execution and receives its result. A failed execution stores
+    nothing, so the next duplicate runs the mutation again"""
+
+    @abstractmethod
+    def get(self, key):
+        """Returns the result stored for `key`, or MISSING"""
+
+    @abstractmethod
+    def set(self, key, result):
+        """Stores the result of the execution claiming `key`"""
+
+    @abstractmethod
+    def claim(self, key):
+        """Claims `key` for an execution and returns MISSING, or returns
+        the result stored by another execution. Waits while another
+        execution holds the claim"""
+
+    @abstractmethod
+    def release(self, key):
+        """Drops the claim of an execution storing no result"""
+
+    def run(self, key, fn, unit_of_work=None):
+        """Runs `fn` once per key. With a `unit_of_work` the result is
+        stored once the operation commits, and the claim is released when
+        it rolls back"""
+        result = self.claim(key)
+        if result is not MISSING:
+            return result
+        try:
+            result = fn()
+        except Exception as e:
+            self.release(key)
+            raise e
+        if unit_of_work is None:
+            self.set(key, result)
+        else:
+            unit_of_work.on_commit(partial(self.set, key, result))
+            unit_of_work.on_rollback(partial(self.release, key))
+        return result
+
+
+def _still_running(key):
+    return Exception(f'Mutation with idempotency key "{key}" is still '
+                     f'running')
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Keeps the last `maxsize` results in process memory"""
+
+    def __init__(self, maxsize=1024, timeout=30):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._results = OrderedDict()
+        self._claimed = set()
+        self._condition = threading.Condition()
+
+    def get(self, key):
+        with self._condition:
+            if key not in self._results:
+                return MISSING
+            self._results.move_to_end(key)
+            return self._results[key]
+
+    def set(self, key, result):
+        with self._condition:
+            self._claimed.discard(key)
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+            self._condition.notify_all()
+
+    def claim(self, key):
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while key in self._claimed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise _still_running(key)
+                self._condition.wait(remaining)
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+            self._claimed.add(key)
+            return MISSING
+
+    def release(self, key):
+        with self._condition:
+            self._claimed.discard(key)
+            self._condition.notify_all()
+
+
+class SQLIdempotencyStore(IdempotencyStore):
+    """Keeps the results in a table shared by every process using `bind`.
+    The first execution claims the key by inserting its row, duplicates
+    poll the row until the result is stored. A claim older than
+    `lease_timeout` seconds is considered abandoned by a crashed process
+    and is taken over, the lease must outlast the slowest mutation. The
+    table is created on first use when it doesn't exist"""
+
+    def __init__(self, bind, table_name='graphene_idempotency_keys',
+                 poll_interval=0.05, timeout=30, lease_timeout=300):
+        self.bind = bind
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.lease_timeout = lease_timeout
+        self.table = Table(
+            table_name, MetaData(),
+            Column('key', String(255), primary_key=True),
+            Column('done', Boolean, nullable=False, default=False),
+            Column('result', PickleType),
+            Column('created_at', DateTime, server_default=func.now()))
+        self._table_created = False
+        self._table_lock = threading.Lock()
+
+    def create_table(self):
+        with self._table_lock:
+            if not self._table_created:
+                self.table.create(self.bind, checkfirst=True)
+                self._table_created = True
+
+    def get(self, key):
+        row = self._get_row(key)
+        if row is None or not row.done:
+            return MISSING
+        return row.result
+
+    def set(self, key, result):
+        with self.bind.begin() as connection:
+            connection.execute(
+                self.table.update().where(self.table.c.key == key),
+                {'done': True, 'result': result})
+
+    def claim(self, key):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            row = self._get_row(key)
+            if row is None:
+                if self._insert_claim(key):
+                    return MISSING
+                continue
+            if row.done:
+                return row.result
+            if self._is_expired(row) and self._take_over(key, row):
+                return MISSING
+            if time.monotonic() > deadline:
+                raise _still_running(key)
+            time.sleep(self.poll_interval)
+
+    def release(self, key):
+        with self.bind.begin() as connection:
+            connection.execute(self.table.delete().where(
+                (self.table.c.key == key) & ~self.table.c.done))
+
+    def _get_row(self, key):
+        self.create_table()
+        with self.bind.connect() as connection:
+            return connection.execute(self.table.select().where(
+                self.table.c.key == key)).first()
+
+    def _insert_claim(self, key):
+        try:
+            with self.bind.begin() as connection:
+                connection.execute(self.table.insert(), {
+                    'key': key, 'done': False,
+                    'created_at': datetime.utcnow()})
+        except IntegrityError:
+            return False
+        return True
+
+    def _is_expired(self, row):
+        # The claims are timestamped by the stores, not by the database
+        # clock, so the lease doesn't depend on its time zone
+        return row.created_at is None or row.created_at < \
+            datetime.utcnow() - timedelta(seconds=self.lease_timeout)
+
+    def _take_over(self, key, row):
+        """Renews an expired claim, only one of the duplicates racing for
+        it matches the old timestamp"""
+        table = self.table
+        with self.bind.begin() as connection:
+            result = connection.execute(
+                table.update()
+                .where(table.c.key == key)
+                .where(~table.c.done)
+                .where(table.c.created_at == row.created_at),
+                {'created_at': datetime.utcnow()})
+        return result.rowcount == 1
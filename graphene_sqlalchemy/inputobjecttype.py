@@ -3,7 +3,8 @@ import sys
 from graphene.types.inputobjecttype import InputObjectTypeOptions as Options
 
 from .converter import convert_model_to_attributes
-from .relay import from_global_id
+from .global_id import default_global_id_codec
+from .utils import get_model_primary_key
 
 
 class InputObjectTypeOptions(Options):
@@ -25,6 +26,8 @@ class InputObjectType(graphene.InputObjectType):
             only_fields=(),
             exclude_fields=(),
             type_cast=None,
+            partial=False,
+            attributes_name=None,
             _meta=None,
             **options):
         def _iter_fields(attributes):
@@ -58,7 +61,8 @@ class InputObjectType(graphene.InputObjectType):
             attributes = convert_model_to_attributes(
                 model,
                 connection_field_factory=connection_factory,
-                attributes_name=model.__name__ + 'InputAttributes',
+                attributes_name=attributes_name or
+                model.__name__ + 'InputAttributes',
                 only_fields=only_fields,
                 exclude_fields=exclude_fields,
                 type_cast=type_cast,
@@ -68,6 +72,10 @@ class InputObjectType(graphene.InputObjectType):
                 embedded_type = _embedded_input_type(field)
                 if embedded_type:
                     embedded_inputs[name] = embedded_type
+                if partial and isinstance(field.type, graphene.NonNull):
+                    # Every field of a partial input is optional
+                    field = graphene.Field(field.type.of_type,
+                                           description=field.description)
                 setattr(cls, name, field)
 
         _meta.embedded_inputs = embedded_inputs
@@ -83,48 +91,84 @@ class InputObjectType(graphene.InputObjectType):
     def to_dictionary(self, session):
         """Method to convert Graphene inputs into dictionary"""
         dictionary = dict(self)
-        try:
-            for key, value in dictionary.items():
-                # Convert GraphQL global id to database id
-                if key[-2:] == 'id':
-                    dictionary[key] = self.from_global_id(value)
-                elif key in self._meta.embedded_inputs:
-                    embedded_input = self._meta.embedded_inputs[key]
-                    model_cls = embedded_input._meta.model
-                    if isinstance(value, list):
-                        dictionary[key] = [
-                            self.to_embedded_model(session, model_cls, **v)
-                            for v in value
-                        ]
-                    else:
-                        dictionary[key] = self.to_embedded_model(
-                            session, model_cls, **value)
-        except Exception as e:
-            session.rollback()
-            raise e
+        embedded = []
+        for key, value in dictionary.items():
+            # Convert GraphQL global id to database id
+            if key[-2:] == 'id':
+                dictionary[key] = self.from_global_id(value)
+            elif key in self._meta.embedded_inputs and value is not None:
+                embedded_input = self._meta.embedded_inputs[key]
+                model_cls = embedded_input._meta.model
+                embedded.append((key, model_cls, value))
+        if embedded:
+            self._resolve_embedded(session, dictionary, embedded)
         return dictionary
 
+    @classmethod
+    def _resolve_embedded(self, session, dictionary, embedded):
+        # Load every referenced row with one IN query per model class
+        ids_for_model = {}
+        for key, model_cls, value in embedded:
+            items = value if isinstance(value, list) else [value]
+            ids = ids_for_model.setdefault(model_cls, set())
+            for data in items:
+                model_id = self.from_global_id(data.get('id'))
+                if model_id:
+                    ids.add(model_id)
+
+        loaded = {}
+        for model_cls, ids in ids_for_model.items():
+            if not ids:
+                continue
+            primary_key = get_model_primary_key(model_cls)
+            for model in session.query(model_cls) \
+                    .filter(primary_key.in_(ids)):
+                loaded[model_cls, str(getattr(model, primary_key.key))] = \
+                    model
+
+        for key, model_cls, value in embedded:
+            if isinstance(value, list):
+                dictionary[key] = [
+                    self._apply_embedded(loaded, model_cls, **v)
+                    for v in value
+                ]
+            else:
+                dictionary[key] = self._apply_embedded(
+                    loaded, model_cls, **value)
+
     @classmethod
     def from_global_id(self, global_id):
-        try:
-            return from_global_id(global_id)[1]
-        except Exception as _:
-            pass
-        return global_id
+        decoded = default_global_id_codec.decode(global_id)
+        if decoded is None:
+            return global_id
+        return decoded[1]
 
     @classmethod
-    def to_embedded_model(self, session, model_cls, **data):
+    def _apply_embedded(self, loaded, model_cls, **data):
         model = None
         model_id = self.from_global_id(data.get('id'))
         if model_id:
-            model = session.query(model_cls).get(model_id)
+            model = loaded.get((model_cls, str(model_id)))
             data['id'] = model_id
 
         if not model:
             model = model_cls(**data)
         else:
+            # The row was matched by its id, the decoded string would
+            # only trigger a redundant UPDATE of the primary key
+            data.pop('id', None)
             for field, value in data.items():
                 if getattr(model, field) == value:
                     continue
                 setattr(model, field, value)
         return model
+
+    @classmethod
+    def to_embedded_model(self, session, model_cls, **data):
+        model = None
+        model_id = self.from_global_id(data.get('id'))
+        loaded = {}
+        if model_id:
+            model = session.query(model_cls).get(model_id)
+            loaded[model_cls, str(model_id)] = model
+        return self._apply_embedded(loaded, model_cls, **data)
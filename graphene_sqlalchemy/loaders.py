@@ -0,0 +1,119 @@
+from graphene.types.resolver import get_default_resolver
+from promise import Promise
+from promise.dataloader import DataLoader
+from sqlalchemy import func
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import interfaces
+
+from .utils import (get_context_value, get_query, get_session,
+                    is_mapped_instance)
+
+# Key of the request-scoped loaders in the GraphQL context
+LOADERS_CONTEXT_KEY = '_graphene_sqlalchemy_loaders'
+
+
+def get_loader(context, key, factory):
+    """Returns the loader stored under `key` for the current request,
+    creating it with `factory` on first use"""
+    loaders = get_context_value(context, LOADERS_CONTEXT_KEY, dict)
+    if key not in loaders:
+        loaders[key] = factory()
+    return loaders[key]
+
+
+def get_relationship_key_columns(relationship):
+    """Returns the (parent column, foreign column) pair joining a to-many
+    relationship, the foreign column lives in the child or the secondary
+    table"""
+    pairs = relationship.synchronize_pairs
+    assert len(pairs) == 1, \
+        f'Relationship {relationship} must be joined by a single column'
+    return pairs[0]
+
+
+def get_relationship_columns(relationship):
+    """Returns the column of the parent holding the key of the related
+    rows and the column matched against it when loading them"""
+    source, dest = get_relationship_key_columns(relationship)
+    if relationship.direction == interfaces.MANYTOONE:
+        return dest, source
+    return source, dest
+
+
+def get_parent_key_attribute(relationship):
+    parent_column, _ = get_relationship_columns(relationship)
+    mapper = inspect(relationship.parent.entity)
+    return mapper.get_property_by_column(parent_column).key
+
+
+def get_parent_key(relationship, root):
+    return getattr(root, get_parent_key_attribute(relationship))
+
+
+class RelationshipCountLoader(DataLoader):
+    """Counts the rows of a to-many relationship for a batch of parents
+    with one `SELECT fk, count(*) ... WHERE fk IN (...) GROUP BY fk`"""
+
+    def __init__(self, relationship, context, **kwargs):
+        self.relationship = relationship
+        self.context = context
+        super().__init__(**kwargs)
+
+    def batch_load_fn(self, keys):
+        _, foreign_column = get_relationship_key_columns(self.relationship)
+        session = get_query(self.relationship.parent.entity,
+                            self.context).session
+        rows = session.query(foreign_column, func.count()) \
+            .filter(foreign_column.in_(set(keys))) \
+            .group_by(foreign_column) \
+            .all()
+        counts = dict(rows)
+        return Promise.resolve([counts.get(k, 0) for k in keys])
+
+
+def resolve_relationship(relationship, root, info, **args):
+    """Returns the related rows, with an AsyncSession or a record parent
+    they are loaded in batches instead of by a lazy load"""
+    from .aio import is_async_session, load_relationship
+    from .records import Record, load_record_relationship
+    if isinstance(root, Record):
+        return load_record_relationship(relationship, info.context, root)
+    session = get_session(info.context)
+    if not is_async_session(session) or not is_mapped_instance(root):
+        # Like the default resolver, mutation payloads aren't instances
+        return getattr(root, relationship.key, None)
+    if relationship.key in inspect(root).dict:
+        return getattr(root, relationship.key)
+    return load_relationship(relationship, session, info.context, root)
+
+
+def get_model_default_resolver(model, default_resolver=None):
+    """Default resolver of the fields of an ObjectType of `model`, the
+    relationships are resolved by `resolve_relationship`. Graphene only
+    calls it for fields without a `resolve_<name>` method"""
+    relationships = inspect(model).relationships
+
+    def resolver(attname, default_value, root, info, **args):
+        relationship = relationships.get(attname)
+        if relationship is not None:
+            return resolve_relationship(relationship, root, info, **args)
+        return (default_resolver or get_default_resolver())(
+            attname, default_value, root, info, **args)
+    return resolver
+
+
+def resolve_relationship_count(relationship, root, info, **args):
+    from .aio import is_async_session, load_relationship_count
+    parent_column, _ = get_relationship_key_columns(relationship)
+    mapper = inspect(relationship.parent.entity)
+    key = getattr(root, mapper.get_property_by_column(parent_column).key)
+    if key is None:
+        return 0
+    session = get_session(info.context)
+    if is_async_session(session):
+        return load_relationship_count(
+            relationship, session, info.context, key)
+    loader = get_loader(
+        info.context, ('count', relationship),
+        lambda: RelationshipCountLoader(relationship, info.context))
+    return loader.load(key)
@@ -1,14 +1,66 @@
+import asyncio
 import graphene
 import sys
+from contextlib import contextmanager
+from functools import partial
+from graphene.types.unmountedtype import UnmountedType
+from graphene.types.utils import get_type
+from sqlalchemy import literal, select
 from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import interfaces
 
+from .aio import is_async_session, run_sync
+from .idempotency import MemoryIdempotencyStore
+from .inputobjecttype import InputObjectType
+from .loaders import get_relationship_key_columns
+from .permissions import ALL_FIELDS, PermissionMatrix
+from .routing import RoutingSession
+from .transaction import get_unit_of_work
+from .utils import get_selection_names
+
+UPSERT_STRATEGIES = ('orm', 'native')
+COMMIT_MODES = ('field', 'operation')
+RELATIONSHIP_SYNC_MODES = ('orm', 'sql')
+
+# Cache for the generated partial inputs, to avoid name clash
+_PARTIAL_INPUT_TYPES = {}
+# Permissions compiled from the last roles map returned by the callable
+# `roles_map` of a mutation, the options are frozen after class creation
+_CALLABLE_PERMISSIONS = {}
+
+
+def get_native_insert(dialect):
+    """Returns the `insert` construct supporting `ON CONFLICT` for a
+    dialect, None when the dialect has no native upsert"""
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        try:
+            from sqlalchemy.dialects.sqlite import insert
+        except ImportError:
+            # Added in SQLAlchemy 1.4
+            return None
+        return insert
+    return None
+
+
+def supports_returning(dialect):
+    # `full_returning` on SQLAlchemy 1.4, `insert_returning` from 2.0
+    return bool(getattr(dialect, 'insert_returning', None) or
+                getattr(dialect, 'full_returning', None))
+
 
 class MutationOptions(graphene.types.mutation.MutationOptions):
     session = None
     user_roles = None
     roles_map = None
     relationship_foreign_fields_map = None
+    upsert_strategy = None
+    commit_mode = None
+    relationship_sync = None
+    idempotency_store = None
+    permissions = None
 
     def freeze(self):
         if 'pytest' in sys.modules:
@@ -25,6 +77,10 @@ class Mutation(graphene.Mutation):
                                     session=None,
                                     user_roles=None,
                                     roles_map=None,
+                                    upsert_strategy='orm',
+                                    commit_mode='field',
+                                    relationship_sync='orm',
+                                    idempotency_store=None,
                                     arguments=None,
                                     _meta=None,
                                     **options):
@@ -34,9 +90,30 @@ class Mutation(graphene.Mutation):
         _meta.roles_map = roles_map
         _meta.session = session
         _meta.relationship_foreign_fields_map = dict()
+        if not callable(roles_map):
+            _meta.permissions = PermissionMatrix(roles_map)
         assert _meta.session, 'db session not provided'
+        assert upsert_strategy in UPSERT_STRATEGIES, \
+            f'upsert_strategy must be one of {UPSERT_STRATEGIES}, ' \
+            f'received "{upsert_strategy}"'
+        _meta.upsert_strategy = upsert_strategy
+        assert commit_mode in COMMIT_MODES, \
+            f'commit_mode must be one of {COMMIT_MODES}, ' \
+            f'received "{commit_mode}"'
+        _meta.commit_mode = commit_mode
+        assert relationship_sync in RELATIONSHIP_SYNC_MODES, \
+            f'relationship_sync must be one of {RELATIONSHIP_SYNC_MODES}, ' \
+            f'received "{relationship_sync}"'
+        _meta.relationship_sync = relationship_sync
+        if idempotency_store is True:
+            idempotency_store = MemoryIdempotencyStore()
+        _meta.idempotency_store = idempotency_store
         super().__init_subclass_with_meta__(
-            resolver, output, arguments, _meta, **options)
+            resolver=resolver, output=output, arguments=arguments,
+            _meta=_meta, **options)
+        if idempotency_store:
+            _meta.arguments['idempotency_key'] = graphene.Argument(
+                graphene.String)
 
         # Build foreign fields map
         output = cls._meta.output
@@ -51,12 +128,122 @@ class Mutation(graphene.Mutation):
             _meta.relationship_foreign_fields_map[f.key] = fk_field.name
 
     @classmethod
-    def mutate(cls, root, info, input=None):
+    def Field(cls, name=None, description=None, deprecation_reason=None,
+              required=False, bulk=False):  # noqa: N802
+        if not bulk:
+            return super().Field(name, description, deprecation_reason,
+                                 required)
+        args = {'input': graphene.Argument(
+            graphene.List(graphene.NonNull(cls._get_input_type())),
+            required=True)}
+        if cls._meta.idempotency_store:
+            args['idempotency_key'] = graphene.Argument(graphene.String)
+        return graphene.Field(
+            graphene.List(graphene.NonNull(cls._meta.output)),
+            args=args,
+            resolver=cls.mutate_bulk,
+            name=name,
+            description=description or cls._meta.description,
+            deprecation_reason=deprecation_reason,
+            required=required,
+        )
+
+    @classmethod
+    def UpdateWhereField(cls, name=None, description=None,
+                         deprecation_reason=None, required=False):  # noqa
+        """Field updating every row matching the `filter_fields` of the
+        output Node with a single `UPDATE ... WHERE`, named
+        `update<Model>Where` and returning the affected count"""
+        filter_fields = cls._get_filter_fields()
+        model_name = cls._meta.output._meta.model.__name__
+        return graphene.Field(
+            graphene.Int,
+            args=dict(filter_fields, input=graphene.Argument(
+                cls._get_partial_input_type(), required=True)),
+            resolver=cls.mutate_where,
+            name=name or f'update{model_name}Where',
+            description=description or cls._meta.description,
+            deprecation_reason=deprecation_reason,
+            required=required,
+        )
+
+    @classmethod
+    def DeleteWhereField(cls, name=None, description=None,
+                         deprecation_reason=None, required=False):  # noqa
+        """Field deleting every row matching the `filter_fields` of the
+        output Node with a single `DELETE ... WHERE`, named
+        `delete<Model>Where` and returning the affected count"""
+        filter_fields = cls._get_filter_fields()
+        model_name = cls._meta.output._meta.model.__name__
+        return graphene.Field(
+            graphene.Int,
+            args=dict(filter_fields),
+            resolver=cls.delete_where,
+            name=name or f'delete{model_name}Where',
+            description=description or cls._meta.description,
+            deprecation_reason=deprecation_reason,
+            required=required,
+        )
+
+    @classmethod
+    def _get_input_type(cls):
+        input_argument = cls._meta.arguments['input']
+        if isinstance(input_argument, UnmountedType):
+            input_type = input_argument.get_type()
+        else:
+            input_type = get_type(input_argument.type)
+        if isinstance(input_type, graphene.NonNull):
+            input_type = input_type.of_type
+        return input_type
+
+    @classmethod
+    def _get_partial_input_type(cls):
+        """Returns the input of the mutation without its primary key and
+        its embedded relationship inputs, with every field optional, used
+        to update rows by filter"""
+        input_type = cls._get_input_type()
+        name = f'{input_type._meta.name}Patch'
+        if name not in _PARTIAL_INPUT_TYPES:
+            mapper = inspect(cls._meta.output._meta.model)
+            pk_names = {mapper.get_property_by_column(c).key
+                        for c in mapper.primary_key}
+            meta = type('Meta', (), {
+                'schema': cls._meta.output,
+                'only_fields': tuple(
+                    n for n in input_type._meta.fields
+                    if n not in pk_names and
+                    n not in input_type._meta.embedded_inputs),
+                'partial': True,
+                # The attributes of the full input are cached under the
+                # default name
+                'attributes_name': f'{name}Attributes',
+            })
+            _PARTIAL_INPUT_TYPES[name] = type(
+                name, (InputObjectType,), {'Meta': meta})
+        return _PARTIAL_INPUT_TYPES[name]
+
+    @classmethod
+    def _get_filter_fields(cls):
+        for interface in cls._meta.output._meta.interfaces:
+            filter_fields = getattr(interface._meta, 'filter_fields', None)
+            if filter_fields:
+                return filter_fields
+        raise AssertionError(
+            f'{cls._meta.output} must implement a Node with filter_fields')
+
+    @classmethod
+    def _get_session(cls, info):
         db_session = cls._meta.session
         if callable(db_session):
             db_session = db_session(info)
         assert db_session, 'db session not provided'
+        if isinstance(db_session, RoutingSession):
+            # Mutations read and write on the primary
+            db_session.pin_primary()
+        return db_session
 
+    @classmethod
+    def _get_roles(cls, info):
         user_roles = cls._meta.user_roles
         if callable(user_roles):
             user_roles = user_roles(info)
@@ -64,12 +251,105 @@ class Mutation(graphene.Mutation):
         roles_map = cls._meta.roles_map
         if callable(roles_map):
             roles_map = roles_map(info)
+        return user_roles, roles_map
 
-        output = cls._meta.output
+    @classmethod
+    def _get_selection(cls, info):
+        field_ast = next(iter(info.field_asts), None)
+        return get_selection_names(field_ast.selection_set, info.fragments)
+
+    @classmethod
+    def _map_foreign_fields(cls, data):
         foreign_fields_map = cls._meta.relationship_foreign_fields_map
+        relationships = list(data.keys() & foreign_fields_map.keys())
+        for r in relationships:
+            n = foreign_fields_map[r]
+            data[n] = data.pop(r)
+            assert data[n], data
+        return data
+
+    @classmethod
+    def _to_record(cls, model, selection):
+        if isinstance(model, dict):
+            new_record = dict(model)
+        else:
+            new_record = model.as_dict(selection)
+        for k, v in cls._meta.relationship_foreign_fields_map.items():
+            if v not in new_record:
+                continue
+            del new_record[v]
+        return new_record
+
+    @classmethod
+    def _to_dictionary(cls, session, input):
+        """Converts `input` for the session. In `operation` commit mode a
+        failing conversion is left to the unit of work, rolling back the
+        session would discard the fields written before"""
+        try:
+            return input.to_dictionary(session)
+        except Exception as e:
+            if cls._meta.commit_mode != 'operation':
+                session.rollback()
+            raise e
+
+    @classmethod
+    def _to_output(cls, records):
+        if isinstance(records, list):
+            return [cls._meta.output(**r) for r in records]
+        return cls._meta.output(**records)
+
+    @classmethod
+    def _run_idempotent(cls, info, key, fn):
+        """Runs `fn(session)` once per idempotency key, a replay returns
+        the stored records without touching the database. With an
+        AsyncSession `fn` runs in `run_sync` and an awaitable is returned"""
+        db_session = cls._get_session(info)
+        store = cls._meta.idempotency_store
+        key = store and key and f'{cls.__name__}:{key}'
+        # In operation commit mode the result is stored once the writes
+        # are committed
+        unit_of_work = None
+        if cls._meta.commit_mode == 'operation':
+            unit_of_work = get_unit_of_work(info.context)
+        if is_async_session(db_session):
+            return cls._run_idempotent_async(
+                db_session, store, key, fn, unit_of_work)
+        if key:
+            records = store.run(key, partial(fn, db_session), unit_of_work)
+        else:
+            records = fn(db_session)
+        return cls._to_output(records)
+
+    @classmethod
+    async def _run_idempotent_async(cls, db_session, store, key, fn,
+                                    unit_of_work=None):
+        if key:
+            # Duplicates block on the store, they wait in a worker thread
+            # while the first execution runs on the event loop
+            loop = asyncio.get_event_loop()
+
+            def run():
+                return asyncio.run_coroutine_threadsafe(
+                    run_sync(db_session, fn), loop).result()
+            records = await loop.run_in_executor(
+                None, store.run, key, run, unit_of_work)
+        else:
+            records = await run_sync(db_session, fn)
+        return cls._to_output(records)
+
+    @classmethod
+    def mutate(cls, root, info, input=None, idempotency_key=None):
+        return cls._run_idempotent(
+            info, idempotency_key, partial(cls._mutate, info, input))
+
+    @classmethod
+    def _mutate(cls, info, input, db_session):
+        user_roles, roles_map = cls._get_roles(info)
+
+        output = cls._meta.output
         assert output, f'no output for {cls}'
 
-        data = input.to_dictionary(db_session)
+        data = cls._to_dictionary(db_session, input)
         data_for_update = cls._available_fields_for_user(
             user_roles, roles_map, **data)
 
@@ -78,101 +358,396 @@ class Mutation(graphene.Mutation):
         model_pk = data.get(pk_name)
         model = None
 
+        if not model_pk and pk_name in data_for_update:
+            data_for_update.pop(pk_name)
+        data_for_update = cls._map_foreign_fields(data_for_update)
+
+        selection = cls._get_selection(info)
+        if cls._can_native_upsert(model_cls, db_session, data_for_update):
+            with cls._transaction(info, db_session):
+                new_record, pk = cls._native_write(
+                    model_cls, db_session, selection, data_for_update)
+            if new_record is None:
+                new_record = db_session.query(model_cls) \
+                    .populate_existing().get(pk)
+            return cls._to_record(new_record, selection)
+
         if model_pk:
             model = db_session.query(model_cls).get(model_pk)
-        elif pk_name in data_for_update:
-            data_for_update.pop(pk_name)
+        with cls._transaction(info, db_session):
+            model = cls._write(model, model_cls, db_session, data_for_update)
+            # Read the flushed state before the commit expires it, so the
+            # output doesn't need a refresh SELECT
+            new_record = cls._to_record(model, selection)
+        return new_record
 
-        relationships = list(data_for_update.keys() &
-                             foreign_fields_map.keys())
-        for r in relationships:
-            n = foreign_fields_map[r]
-            data_for_update[n] = data_for_update.pop(r)
-            assert data_for_update[n], data_for_update
+    @classmethod
+    def mutate_bulk(cls, root, info, input=None, idempotency_key=None):
+        """Upserts a list of inputs in one transaction. Rows are written
+        with executemany-style bulk inserts and updates, rows carrying
+        to-many relationships go through the ORM"""
+        return cls._run_idempotent(
+            info, idempotency_key and f'bulk:{idempotency_key}',
+            partial(cls._mutate_bulk, info, input))
 
-        field_ast = next(iter(info.field_asts), None)
-        selection = [f.name.value for f in field_ast.selection_set.selections]
-        new_record = cls.upsert(
-            model, model_cls, db_session, **data_for_update
-        ).as_dict(selection)
+    @classmethod
+    def _mutate_bulk(cls, info, input, db_session):
+        user_roles, roles_map = cls._get_roles(info)
+        model_cls = cls._meta.output._meta.model
+        mapper = inspect(model_cls)
+        pk_name = mapper.primary_key[0].name
+        to_many = {r.key for r in mapper.relationships if r.uselist}
 
-        for k, v in foreign_fields_map.items():
-            if v not in new_record:
-                continue
-            del new_record[v]
+        items = []
+        allowed_for_field_set = {}
+        for item in input or []:
+            data = cls._to_dictionary(db_session, item)
+            field_set = (frozenset(data),
+                         frozenset(k for k, v in data.items()
+                                   if v is not None))
+            if field_set not in allowed_for_field_set:
+                allowed_for_field_set[field_set] = frozenset(
+                    cls._available_fields_for_user(
+                        user_roles, roles_map, **data))
+            allowed = allowed_for_field_set[field_set]
+            items.append(cls._map_foreign_fields(
+                {k: v for k, v in data.items() if k in allowed}))
+
+        pk_column = getattr(model_cls, pk_name)
+        pks = [d[pk_name] for d in items if d.get(pk_name)]
+        existing = set()
+        if pks:
+            existing = {str(pk) for pk, in db_session.query(pk_column)
+                        .filter(pk_column.in_(pks))}
+
+        inserts, updates, orm_items = [], [], []
+        for data in items:
+            is_update = str(data.get(pk_name)) in existing
+            if not data.get(pk_name):
+                data.pop(pk_name, None)
+            if data.keys() & to_many:
+                orm_items.append((data, is_update))
+            elif is_update:
+                updates.append(data)
+            else:
+                inserts.append(data)
+
+        with cls._transaction(info, db_session):
+            if inserts:
+                cls._bulk_insert(model_cls, db_session, inserts)
+            if updates:
+                db_session.bulk_update_mappings(model_cls, updates)
+            for data, is_update in orm_items:
+                model = db_session.query(model_cls).get(data[pk_name]) \
+                    if is_update else None
+                model = cls._write(model, model_cls, db_session, dict(data))
+                data[pk_name] = getattr(model, pk_name)
+
+        pks = [d[pk_name] for d in items]
+        models = {str(getattr(m, pk_name)): m for m in db_session
+                  .query(model_cls).populate_existing()
+                  .filter(pk_column.in_(pks))}
+        selection = cls._get_selection(info)
+        return [cls._to_record(models[str(pk)], selection) for pk in pks]
+
+    @classmethod
+    def _bulk_insert(cls, model_cls, session, inserts):
+        """Inserts the rows and sets the generated primary keys on the
+        ones without it. Rows carrying their primary key go in one
+        executemany. Where the dialect supports `RETURNING` the others
+        are written by one multi-row INSERT per set of columns, which
+        returns the keys in the order of the VALUES on PostgreSQL and
+        SQLite. Other dialects only report the key of a single row
+        statement, so those rows are inserted one by one"""
+        mapper = inspect(model_cls)
+        pk_column = mapper.primary_key[0]
+        with_pk = [d for d in inserts if pk_column.name in d]
+        if with_pk:
+            session.bulk_insert_mappings(model_cls, with_pk)
+
+        table = mapper.local_table
+        groups = {}
+        for data in inserts:
+            if pk_column.name not in data:
+                groups.setdefault(frozenset(data), []).append(data)
+        if not groups:
+            return
+        if not supports_returning(session.get_bind(mapper).dialect):
+            for rows in groups.values():
+                for data in rows:
+                    result = session.execute(table.insert().values(
+                        {mapper.columns[k].name: v for k, v in data.items()}))
+                    data[pk_column.name] = result.inserted_primary_key[0]
+            return
+        for rows in groups.values():
+            result = session.execute(table.insert().values([
+                {mapper.columns[k].name: v for k, v in data.items()}
+                for data in rows]).returning(pk_column))
+            for data, (pk,) in zip(rows, result):
+                data[pk_column.name] = pk
+
+    @classmethod
+    def _run(cls, info, fn):
+        db_session = cls._get_session(info)
+        if is_async_session(db_session):
+            return run_sync(db_session, fn)
+        return fn(db_session)
+
+    @classmethod
+    def _query_where(cls, info, session, **filters):
+        if not filters:
+            raise Exception('No filter provided')
+        output = cls._meta.output
+        query_filter = None
+        search_fields = None
+        for interface in output._meta.interfaces:
+            if getattr(interface._meta, 'filter_fields', None):
+                query_filter = interface._meta.query_filter
+                search_fields = interface._meta.search_fields
+                break
+        return output.filter_query(
+            session.query(output._meta.model), query_filter=query_filter,
+            search_fields=search_fields, **filters).order_by(None)
+
+    @classmethod
+    def mutate_where(cls, root, info, input=None, **filters):
+        """Updates the rows matching `filters` with the fields of `input`
+        allowed for the user, in one statement"""
+        return cls._run(info, partial(cls._update_where, info, input, filters))
+
+    @classmethod
+    def _update_where(cls, info, input, filters, db_session):
+        user_roles, roles_map = cls._get_roles(info)
+        mapper = inspect(cls._meta.output._meta.model)
+        pk_name = mapper.primary_key[0].name
+
+        data = cls._to_dictionary(db_session, input)
+        data = cls._map_foreign_fields(cls._available_fields_for_user(
+            user_roles, roles_map, **data))
+        data.pop(pk_name, None)
+        for k in data:
+            if k not in mapper.column_attrs:
+                raise Exception(f'Field {k} can not be updated by filter')
+        if not data:
+            return 0
+
+        query = cls._query_where(info, db_session, **filters)
+        with cls._transaction(info, db_session):
+            count = query.update(data, synchronize_session=False)
+        return count
+
+    @classmethod
+    def delete_where(cls, root, info, **filters):
+        """Deletes the rows matching `filters` in one statement, deleting
+        requires a role allowed to write every field"""
+        return cls._run(info, partial(cls._delete_where, info, filters))
+
+    @classmethod
+    def _delete_where(cls, info, filters, db_session):
+        user_roles, roles_map = cls._get_roles(info)
+        allowed, _ = cls._get_permissions(roles_map) \
+            .fields_for_roles(user_roles)
+        if allowed is not ALL_FIELDS:
+            raise Exception('Delete not allowed for user')
+
+        query = cls._query_where(info, db_session, **filters)
+        with cls._transaction(info, db_session):
+            count = query.delete(synchronize_session=False)
+        return count
 
-        return output(**new_record)
+    @classmethod
+    @contextmanager
+    def _transaction(cls, info, session):
+        """Commits the writes of the block. In `operation` commit mode the
+        block runs in a SAVEPOINT and the commit is left to the unit of
+        work of the operation, so a failing field only rolls back itself"""
+        if cls._meta.commit_mode != 'operation':
+            try:
+                yield
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                session.close()
+                raise e
+            return
+
+        unit_of_work = get_unit_of_work(info.context)
+        assert unit_of_work is not None, \
+            f'{cls.__name__} commits per operation, execute the ' \
+            f'operation inside unit_of_work(context)'
+        unit_of_work.add(session)
+        savepoint = session.begin_nested()
+        try:
+            yield
+            session.flush()
+            savepoint.commit()
+        except Exception as e:
+            savepoint.rollback()
+            raise e
 
     @classmethod
     def upsert(cls, model, model_cls, session, **data):
         try:
-            if not model:
-                model = model_cls(**data)
-                session.add(model)
-            else:
-                for field, value in data.items():
-                    if getattr(model, field) == value:
-                        continue
-                    setattr(model, field, value)
+            model = cls._write(model, model_cls, session, data)
             session.commit()
         except Exception as e:
             session.rollback()
             session.close()
             raise e
+        return model
 
+    @classmethod
+    def _write(cls, model, model_cls, session, data):
+        synced = {}
+        if cls._meta.relationship_sync == 'sql':
+            mapper = inspect(model_cls)
+            for key in list(data):
+                relationship = mapper.relationships.get(key)
+                if relationship is not None and \
+                        relationship.secondary is not None:
+                    synced[relationship] = data.pop(key) or []
+        if not model:
+            model = model_cls(**data)
+            session.add(model)
+        else:
+            for field, value in data.items():
+                if getattr(model, field) == value:
+                    continue
+                setattr(model, field, value)
+        session.flush()
+        for relationship, children in synced.items():
+            cls._sync_relationship(session, model, relationship, children)
         return model
 
     @classmethod
-    def _get_fields_for_role(cls, role, roles_map, **data):
-        allowed_fields = {}
-        disallowed_fields = {}
-        fields_for_role = roles_map.get(role) if roles_map else '*'
-
-        if isinstance(fields_for_role, list):
-            fields_for_role.append('id')
-            for k, v in data.items():
-                if k not in fields_for_role:
-                    disallowed_fields[k] = v
-                else:
-                    allowed_fields[k] = v
-        elif fields_for_role == '*':
-            allowed_fields.update(data)
+    def _sync_relationship(cls, session, model, relationship, children):
+        """Replaces the rows of a many-to-many relationship in its
+        association table with a `DELETE ... WHERE NOT IN` and an
+        `INSERT ... SELECT`, without loading the current collection"""
+        parent_column, parent_fk = get_relationship_key_columns(relationship)
+        pairs = relationship.secondary_synchronize_pairs
+        assert len(pairs) == 1, \
+            f'Relationship {relationship} must be joined by a single column'
+        child_column, child_fk = pairs[0]
 
-        return allowed_fields, disallowed_fields
+        new_children = [c for c in children if inspect(c).key is None]
+        if new_children:
+            session.add_all(new_children)
+            session.flush()
+        parent_mapper = inspect(relationship.parent)
+        parent_id = getattr(
+            model, parent_mapper.get_property_by_column(parent_column).key)
+        child_key = inspect(relationship.mapper) \
+            .get_property_by_column(child_column).key
+        child_ids = list({getattr(c, child_key) for c in children})
+
+        secondary = relationship.secondary
+        delete = secondary.delete().where(parent_fk == parent_id)
+        if child_ids:
+            delete = delete.where(~child_fk.in_(child_ids))
+        session.execute(delete)
+        if child_ids:
+            existing = select([child_fk]).where(parent_fk == parent_id)
+            session.execute(secondary.insert().from_select(
+                [parent_fk, child_fk],
+                select([literal(parent_id, parent_fk.type), child_column])
+                .where(child_column.in_(child_ids))
+                .where(~child_column.in_(existing))))
+        # The collection is read again from the table when accessed
+        session.expire(model, [relationship.key])
 
     @classmethod
-    def _available_fields_for_user(cls, user_roles, roles_map, **data):
-        _fields = {}
-        _allowed_fields = {}
-        _disallowed_fields = {}
+    def _can_native_upsert(cls, model_cls, session, data):
+        if cls._meta.upsert_strategy != 'native':
+            return False
+        dialect = session.get_bind(inspect(model_cls)).dialect.name
+        if get_native_insert(dialect) is None:
+            return False
+        # Relationship values need the unit of work
+        columns = inspect(model_cls).columns
+        return all(k in columns for k in data)
 
-        if not roles_map:
-            _fields.update(cls._get_fields_for_role('*', roles_map, **data))
-        else:
-            available_roles = list(set(roles_map.keys()) & set(user_roles))
+    @classmethod
+    def native_upsert(cls, model_cls, session, selection=None, **data):
+        """Writes the row with a single `INSERT ... ON CONFLICT (pk) DO
+        UPDATE` statement instead of loading and comparing it.
+        Where the dialect supports it the columns in `selection` come back
+        through `RETURNING` and a dictionary is returned, otherwise the
+        row is loaded after the commit"""
+        try:
+            record, pk = cls._native_write(model_cls, session, selection, data)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            session.close()
+            raise e
 
-            if not available_roles:
-                raise Exception('No roles for user')
+        if record is not None:
+            return record
+        return session.query(model_cls).get(pk)
 
-            for role in available_roles:
-                allowed_fields, disallowed_fields = cls._get_fields_for_role(
-                    role, roles_map, **data
-                )
-                _allowed_fields.update(allowed_fields)
-                _disallowed_fields.update(disallowed_fields)
+    @classmethod
+    def _native_write(cls, model_cls, session, selection, data):
+        mapper = inspect(model_cls)
+        table = mapper.local_table
+        dialect = session.get_bind(mapper).dialect
+        insert = get_native_insert(dialect.name)
+        values = {mapper.columns[k].name: v for k, v in data.items()}
+        statement = insert(table).values(**values)
+        pk_names = [c.name for c in table.primary_key.columns]
+        if all(n in values for n in pk_names):
+            update = {n: statement.excluded[n] for n in values
+                      if n not in pk_names}
+            if update:
+                statement = statement.on_conflict_do_update(
+                    index_elements=pk_names, set_=update)
+            else:
+                statement = statement.on_conflict_do_nothing(
+                    index_elements=pk_names)
+        returning = None
+        if selection is not None and supports_returning(dialect):
+            returning = [c for c in mapper.columns
+                         if c.primary_key or c.key in selection]
+            statement = statement.returning(*returning)
 
-            allowed_field_names = list(
-                set(_allowed_fields.keys()) & set(data.keys())
-            )
-            disallowed_fields_names = list(
-                set(_disallowed_fields.keys()) - set(allowed_field_names)
-            )
+        result = session.execute(statement)
+        row = result.first() if returning else None
+        if all(n in values for n in pk_names):
+            pk = tuple(values[n] for n in pk_names)
+        else:
+            pk = tuple(result.inserted_primary_key)
+        if row is not None:
+            return {c.key: v for c, v in zip(returning, row)}, pk
+        return None, pk
 
-            if disallowed_fields_names:
-                for n in disallowed_fields_names:
-                    if data.get(n) is not None:
-                        raise Exception(f'Field {n} not allowed for user')
+    @classmethod
+    def _get_permissions(cls, roles_map):
+        permissions = cls._meta.permissions
+        if permissions is not None and permissions.roles_map is roles_map:
+            return permissions
+        # Callable roles maps are recompiled only when they return another
+        # object
+        permissions = _CALLABLE_PERMISSIONS.get(cls)
+        if permissions is None or permissions.roles_map is not roles_map:
+            permissions = PermissionMatrix(roles_map)
+            _CALLABLE_PERMISSIONS[cls] = permissions
+        return permissions
 
-            _fields.update(_allowed_fields)
+    @classmethod
+    def _get_fields_for_role(cls, role, roles_map, **data):
+        permissions = cls._get_permissions(roles_map)
+        if roles_map and role not in permissions.fields_for_role:
+            return {}, {}
+        allowed, _ = permissions.fields_for_roles([role])
+        allowed_fields = {}
+        disallowed_fields = {}
+        for k, v in data.items():
+            if allowed is ALL_FIELDS or k in allowed:
+                allowed_fields[k] = v
+            else:
+                disallowed_fields[k] = v
+        return allowed_fields, disallowed_fields
 
-        return _fields
+    @classmethod
+    def _available_fields_for_user(cls, user_roles, roles_map, **data):
+        return cls._get_permissions(roles_map).filter(user_roles, data)
@@ -1,18 +1,32 @@
 import graphene
 import sys
 from collections import namedtuple
+from functools import partial
 from graphene.relay.node import InterfaceOptions
 from sqlalchemy import or_, and_, types
+from sqlalchemy.inspection import inspect
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.query import Query
 from sqlalchemy.sql.expression import cast
 
+from .aio import (fetch_all, fetch_first, fetch_get, is_async_session,
+                  resolve_awaitable)
+from .aggregate import create_aggregate_type, resolve_aggregate
 from .converter import (convert_model_to_attributes, get_attributes_fields,
                         FieldType)
 from .fields import default_connection_field_factory
+from .global_id import decode_composite_key
+from .loaders import get_model_default_resolver
 from .registry import get_global_registry, Registry
+from .records import Record
 from .relay import Node
-from .utils import is_mapped_class, is_mapped_instance, get_query
+from .search import apply_search, get_search_fields, RELEVANCE
+from .sharding import (fan_out, get_shard_config, get_shard_infos,
+                       get_shard_session)
+from .statements import (get_filter_statement, get_node_statement,
+                         resolver_type)
+from .utils import (is_mapped_class, is_mapped_instance, get_query,
+                    get_indexed_fields, get_session, primary_key_filter)
 
 
 class ObjectTypeOptions(graphene.types.objecttype.ObjectTypeOptions):
@@ -22,6 +36,9 @@ class ObjectTypeOptions(graphene.types.objecttype.ObjectTypeOptions):
     connection_field_factory = None
     attributes = None
     return_many = None
+    search_fields = None
+    related_sort = False
+    indexed_fields = None
     id = None
 
     def freeze(self):
@@ -46,8 +63,15 @@ class ObjectType(graphene.ObjectType):
         use_connection=None,
         interfaces=(),
         return_many=None,
+        search_fields=None,
+        aggregates=False,
+        relationship_counts=(),
+        related_sort=False,
+        index_aware=False,
+        indexed_fields=None,
         id=None,
         connection_field_factory=default_connection_field_factory,
+        default_resolver=None,
         _meta=None,
         **options
     ):
@@ -79,8 +103,13 @@ class ObjectType(graphene.ObjectType):
             # We create the connection automatically
             if not connection_class:
                 connection_class = graphene.relay.Connection
-            connection = connection_class.create_type(
-                f'{cls.__name__}Connection', node=cls)
+            connection_attrs = {'Meta': {'node': cls}}
+            if aggregates:
+                connection_attrs['aggregate'] = graphene.Field(
+                    create_aggregate_type(model, cls.__name__, registry),
+                    resolver=partial(resolve_aggregate, model))
+            connection = type(f'{cls.__name__}Connection',
+                              (connection_class,), connection_attrs)
 
         if connection is not None:
             assert issubclass(connection, graphene.relay.Connection),\
@@ -102,6 +131,7 @@ class ObjectType(graphene.ObjectType):
                 FieldType.hybrid,
                 FieldType.relationship
             ),
+            relationship_counts=relationship_counts,
         ))
 
         if not _meta:
@@ -109,6 +139,10 @@ class ObjectType(graphene.ObjectType):
 
         _meta.id = id or "id"
         _meta.return_many = return_many
+        _meta.search_fields = get_search_fields(search_fields)
+        _meta.related_sort = related_sort
+        if index_aware or indexed_fields:
+            _meta.indexed_fields = get_indexed_fields(model, indexed_fields)
         _meta.attributes = attributes
         _meta.connection = connection
         _meta.connection_field_factory = connection_field_factory
@@ -121,7 +155,10 @@ class ObjectType(graphene.ObjectType):
             _meta.fields = _fields
 
         super().__init_subclass_with_meta__(
-            _meta=_meta, interfaces=interfaces, **options
+            _meta=_meta, interfaces=interfaces,
+            default_resolver=get_model_default_resolver(
+                model, default_resolver),
+            **options
         )
 
         if not skip_registry:
@@ -131,50 +168,200 @@ class ObjectType(graphene.ObjectType):
     def is_type_of(cls, root, info):
         if isinstance(root, cls):
             return True
+        if isinstance(root, Record):
+            return issubclass(root.model, cls._meta.model)
         if not is_mapped_instance(root):
             raise Exception(f'Received incompatible instance "{root}".')
         return isinstance(root, cls._meta.model)
 
     @classmethod
     def get_query(cls, info):
+        shards = cls._get_shards(info)
+        if shards is not None:
+            shard_ids = shards.get_shard_ids(info.context)
+            assert len(shard_ids) == 1, \
+                f'A query on {cls.__name__} must select a single shard'
+            session = get_shard_session(info.context, shards, shard_ids[0])
+            return session.query(cls._meta.model)
         return get_query(cls._meta.model, info.context)
 
+    @classmethod
+    def _get_shards(cls, info):
+        return get_shard_config(
+            cls._meta.registry, cls._meta.model, info.context)
+
+    @classmethod
+    def _is_unscoped(cls, query):
+        """Whether the cached statements can replace `query`, which
+        neither an overridden `get_query` nor a criterion scopes"""
+        return cls.get_query.__func__ is ObjectType.get_query.__func__ and \
+            query.whereclause is None
+
+    @classmethod
+    def _is_identity_loaded(cls, session, id):
+        # Query.get returns these without a SELECT
+        key = inspect(cls._meta.model).identity_key_from_primary_key(
+            list(id) if isinstance(id, tuple) else [id])
+        return key in session.identity_map
+
+    @classmethod
+    def get_identity(cls, id):
+        """Returns the primary key of the model for the id of a node, a
+        tuple for a composite key, None when it doesn't match the key"""
+        primary_key = inspect(cls._meta.model).primary_key
+        if len(primary_key) == 1:
+            return id
+        return decode_composite_key(id, len(primary_key))
+
     @classmethod
     def get_node(cls, info, id):
+        id = cls.get_identity(id)
+        if id is None:
+            return None
+        shards = cls._get_shards(info)
+        if shards is not None:
+            nodes = fan_out(lambda shard_info: cls.get_node(shard_info, id),
+                            get_shard_infos(info, shards))
+            return next((node for node in nodes if node is not None), None)
         try:
-            node = cls.get_query(info).get(id)
-            return node
+            with resolver_type('get_node'):
+                session = get_session(info.context)
+                query = cls.get_query(info)
+                if query.whereclause is not None:
+                    # Query.get refuses a query with a criterion
+                    dialect = query.session.get_bind(
+                        inspect(cls._meta.model)).dialect
+                    query = query.filter(primary_key_filter(
+                        cls._meta.model, [id], dialect))
+                    if is_async_session(session):
+                        return fetch_first(session, query)
+                    return query.first()
+                if is_async_session(session):
+                    return fetch_get(session, cls._meta.model, id)
+                statement = None
+                if cls._is_unscoped(query) and not cls._is_identity_loaded(
+                        query.session, id):
+                    statement = get_node_statement(cls._meta.model)
+                if statement is None:
+                    return query.get(id)
+                return query.from_statement(statement).params(pk=id).first()
         except NoResultFound:
             return None
 
     @classmethod
-    def filter_node(cls, info, query_filter=None, return_many=False, **kwargs):
-        try:
-            filter_args = []
+    def get_nodes(cls, info, ids):
+        """Returns the nodes of `ids` in their order, None for the missing
+        ones, loaded with a single query"""
+        keys = [cls.get_identity(id) for id in ids]
+        shards = cls._get_shards(info)
+        if shards is not None:
+            results = fan_out(
+                lambda shard_info: cls.get_nodes(shard_info, keys),
+                get_shard_infos(info, shards))
+            return [next((node for node in nodes if node is not None), None)
+                    for nodes in zip(*results)]
+        if all(key is None for key in keys):
+            return [None] * len(keys)
+        model = cls._meta.model
+        with resolver_type('get_nodes'):
             query = cls.get_query(info)
-            if callable(query_filter):
-                query = query.filter(*query_filter(cls._meta.model))
-            for field, value in kwargs.items():
-                column = getattr(cls._meta.model, field)
-                if isinstance(column.type, types.ARRAY):
-                    if isinstance(value, list):
-                        filter_args.append(or_(*[
-                            column.contains('{' + v + '}') for v in value]))
-                    elif isinstance(value, str):
-                        filter_args.append(
-                            column.contains(value))
-                    else:
-                        filter_args.append(column == cast(value, column.type))
+            dialect = query.session.get_bind(inspect(model)).dialect
+            query = query.filter(primary_key_filter(
+                model, {k for k in keys if k is not None}, dialect))
+            session = get_session(info.context)
+            order = partial(cls._order_nodes, keys)
+            if is_async_session(session):
+                return resolve_awaitable(fetch_all(session, query), order)
+            return order(query.all())
+
+    @classmethod
+    def _order_nodes(cls, keys, nodes):
+        # Decoded ids are strings, the keys are compared as strings
+        mapper = inspect(cls._meta.model)
+        nodes_for_key = {}
+        for node in nodes:
+            identity = mapper.primary_key_from_instance(node)
+            nodes_for_key[tuple(str(v) for v in identity)] = node
+        return [
+            None if key is None else nodes_for_key.get(tuple(
+                str(v) for v in (key if isinstance(key, tuple) else (key,))))
+            for key in keys]
+
+    @classmethod
+    def filter_query(cls, query, query_filter=None, search=None,
+                     search_fields=None, **kwargs):
+        """Applies the `filter_fields` arguments of a Node to `query`"""
+        filter_args = []
+        if callable(query_filter):
+            query = query.filter(*query_filter(cls._meta.model))
+        if search:
+            query, order_by = apply_search(
+                query, cls._meta.model,
+                search_fields or cls._meta.search_fields,
+                search, [RELEVANCE])
+            query = query.order_by(*(s.value for s in order_by))
+        for field, value in kwargs.items():
+            column = getattr(cls._meta.model, field)
+            if isinstance(column.type, types.ARRAY):
+                if isinstance(value, list):
+                    filter_args.append(or_(*[
+                        column.contains('{' + v + '}') for v in value]))
+                elif isinstance(value, str):
+                    filter_args.append(
+                        column.contains(value))
                 else:
                     filter_args.append(column == cast(value, column.type))
-            query = query.filter(*filter_args)
-            node = query.all() if return_many else query.first()
-            return node
+            else:
+                filter_args.append(column == cast(value, column.type))
+        return query.filter(*filter_args)
+
+    @classmethod
+    def filter_node(cls, info, query_filter=None, return_many=False,
+                    search=None, search_fields=None, **kwargs):
+        shards = cls._get_shards(info)
+        if shards is not None:
+            nodes = fan_out(
+                lambda shard_info: cls.filter_node(
+                    shard_info, query_filter=query_filter,
+                    return_many=return_many, search=search,
+                    search_fields=search_fields, **kwargs),
+                get_shard_infos(info, shards))
+            if return_many:
+                return [node for shard_nodes in nodes
+                        for node in shard_nodes]
+            return next((node for node in nodes if node is not None), None)
+        try:
+            with resolver_type('filter_node'):
+                query = cls.get_query(info)
+                statement = None
+                if cls._is_unscoped(query) and not query_filter and \
+                        not search and not any(
+                        isinstance(getattr(cls._meta.model, f).type,
+                                   types.ARRAY) for f in kwargs):
+                    statement = get_filter_statement(
+                        cls._meta.model, sorted(kwargs),
+                        first=not return_many)
+                if statement is None:
+                    query = cls.filter_query(
+                        query, query_filter=query_filter, search=search,
+                        search_fields=search_fields, **kwargs)
+                session = get_session(info.context)
+                if is_async_session(session):
+                    fetch = fetch_all if return_many else fetch_first
+                    if statement is not None:
+                        return fetch(session, statement, kwargs)
+                    return fetch(session, query)
+                if statement is not None:
+                    query = query.from_statement(statement).params(**kwargs)
+                node = query.all() if return_many else query.first()
+                return node
         except NoResultFound:
             return None
 
     @classmethod
     def resolve_id(cls, root, info, **args):
+        if isinstance(root, Record):
+            return root.identity()
         if hasattr(root, '__mapper__'):
             keys = root.__mapper__.primary_key_from_instance(root)
             return tuple(keys) if len(keys) > 1 else keys[0]
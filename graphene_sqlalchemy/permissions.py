@@ -0,0 +1,57 @@
+# Marks a role allowed to write every field ('*' in roles_map)
+ALL_FIELDS = '*'
+
+
+class PermissionMatrix(object):
+    """`roles_map` of a Mutation compiled into a frozen set of writable
+    fields per role. The union for every distinct combination of user
+    roles is computed once and cached, so checking an input only walks
+    its fields"""
+
+    def __init__(self, roles_map):
+        self.roles_map = roles_map
+        self.fields_for_role = {}
+        # Roles restricted to a list of fields, they reject the others
+        self.restricted_roles = set()
+        for role, fields in (roles_map or {}).items():
+            if fields == ALL_FIELDS:
+                self.fields_for_role[role] = ALL_FIELDS
+            elif isinstance(fields, (list, tuple, set, frozenset)):
+                self.fields_for_role[role] = frozenset(fields) | {'id'}
+                self.restricted_roles.add(role)
+            else:
+                self.fields_for_role[role] = frozenset()
+        self._combinations = {}
+
+    def fields_for_roles(self, user_roles):
+        """Returns the writable fields for a set of user roles, or
+        ALL_FIELDS, and whether the other fields must be rejected"""
+        if not self.roles_map:
+            return ALL_FIELDS, False
+        key = frozenset(user_roles or ())
+        if key not in self._combinations:
+            roles = key & self.fields_for_role.keys()
+            if not roles:
+                raise Exception('No roles for user')
+            fields = [self.fields_for_role[r] for r in roles]
+            if ALL_FIELDS in fields:
+                allowed = ALL_FIELDS
+            else:
+                allowed = frozenset().union(*fields)
+            self._combinations[key] = (
+                allowed, bool(roles & self.restricted_roles))
+        return self._combinations[key]
+
+    def filter(self, user_roles, data):
+        """Returns the fields of `data` writable with `user_roles`, raises
+        when a restricted role receives a value for another field"""
+        allowed, strict = self.fields_for_roles(user_roles)
+        if allowed is ALL_FIELDS:
+            return dict(data)
+        fields = {}
+        for k, v in data.items():
+            if k in allowed:
+                fields[k] = v
+            elif strict and v is not None:
+                raise Exception(f'Field {k} not allowed for user')
+        return fields
@@ -0,0 +1,172 @@
+from graphene.utils.str_converters import to_snake_case
+from promise import Promise
+from promise.dataloader import DataLoader
+from sqlalchemy import select
+from sqlalchemy.ext.hybrid import HYBRID_PROPERTY
+from sqlalchemy.inspection import inspect
+
+from .loaders import (get_loader, get_parent_key, get_parent_key_attribute,
+                      get_relationship_columns)
+from .utils import get_selection_names, get_selection_set, get_session
+
+_RECORD_CLASSES = {}
+
+
+class Record(object):
+    """Read-only row of a model, built from the columns of a Core select
+    without the identity map and the instrumentation of ORM instances.
+    The columns left out of the select resolve to None"""
+    __slots__ = ()
+    model = None
+    primary_key = ()
+
+    @classmethod
+    def from_rows(cls, keys, rows):
+        records = []
+        for row in rows:
+            record = object.__new__(cls)
+            for key, value in zip(keys, row):
+                setattr(record, key, value)
+            records.append(record)
+        return records
+
+    def __getattr__(self, name):
+        if name in self.__slots__:
+            return None
+        raise AttributeError(name)
+
+    def identity(self):
+        keys = tuple(getattr(self, k) for k in self.primary_key)
+        return keys if len(keys) > 1 else keys[0]
+
+
+def get_record_class(model):
+    """Returns the Record class of `model`, with a slot per column and
+    the hybrid properties of the model"""
+    if model not in _RECORD_CLASSES:
+        mapper = inspect(model)
+        attrs = {
+            '__slots__': tuple(p.key for p in mapper.column_attrs),
+            'model': model,
+            'primary_key': tuple(
+                mapper.get_property_by_column(c).key
+                for c in mapper.primary_key)}
+        for key, descriptor in mapper.all_orm_descriptors.items():
+            if getattr(descriptor, 'extension_type', None) is \
+                    HYBRID_PROPERTY:
+                attrs[key] = property(descriptor.fget)
+        _RECORD_CLASSES[model] = type(
+            f'{model.__name__}Record', (Record,), attrs)
+    return _RECORD_CLASSES[model]
+
+
+def get_record_columns(model, names):
+    """Returns the keys of the columns needed to resolve the fields
+    `names` of `model`, every column when a field isn't a plain column,
+    a relationship or a relationship count"""
+    mapper = inspect(model)
+    record_class = get_record_class(model)
+    keys = set(record_class.primary_key)
+    for name in names:
+        if name == '__typename':
+            continue
+        name = to_snake_case(name)
+        if name.endswith('_count') and \
+                name[:-len('_count')] in mapper.relationships:
+            name = name[:-len('_count')]
+        if name in mapper.relationships:
+            keys.add(get_parent_key_attribute(mapper.relationships[name]))
+        elif name in mapper.column_attrs:
+            keys.add(name)
+        elif name != 'id':
+            return list(record_class.__slots__)
+    return [k for k in record_class.__slots__ if k in keys]
+
+
+def get_node_selection_names(info):
+    """Returns the fields requested on the nodes of a connection"""
+    selection_set = getattr(
+        next(iter(info.field_asts), None), 'selection_set', None)
+    for name in ('edges', 'node'):
+        selection_set = get_selection_set(
+            selection_set, name, info.fragments)
+    return get_selection_names(selection_set, info.fragments)
+
+
+class RecordQuery(object):
+    """Wraps an ORM query, the slices of the connection only select the
+    needed columns and return records"""
+
+    def __init__(self, query, model, keys):
+        self.query = query
+        self.record_class = get_record_class(model)
+        self.keys = keys
+        self.columns = [getattr(model, k) for k in keys]
+
+    def count(self):
+        return self.query.order_by(None).count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        rows = self.query.with_entities(*self.columns)[item]
+        return self.record_class.from_rows(self.keys, rows)
+
+    def iterate(self, start, stop, batch_size):
+        """Yields the records of a slice, fetched `batch_size` rows at a
+        time"""
+        rows = self.query.with_entities(*self.columns) \
+            .slice(start, stop).yield_per(batch_size)
+        for row in rows:
+            yield self.record_class.from_rows(self.keys, [row])[0]
+
+
+class RecordRelationshipLoader(DataLoader):
+    """Loads the related records of a batch of record parents with one
+    Core select"""
+
+    def __init__(self, relationship, context, **kwargs):
+        self.relationship = relationship
+        self.context = context
+        super().__init__(**kwargs)
+
+    def batch_load_fn(self, keys):
+        relationship = self.relationship
+        model = relationship.mapper.entity
+        record_class = get_record_class(model)
+        _, key_column = get_relationship_columns(relationship)
+        statement = select([key_column] + [
+            getattr(model, k) for k in record_class.__slots__])
+        if relationship.secondary is not None:
+            pairs = relationship.secondary_synchronize_pairs
+            assert len(pairs) == 1, \
+                f'Relationship {relationship} must be joined by a single ' \
+                f'column'
+            target_column, secondary_column = pairs[0]
+            statement = statement.select_from(
+                inspect(model).local_table).join(
+                relationship.secondary, target_column == secondary_column)
+        statement = statement.where(key_column.in_(set(keys)))
+        if relationship.order_by:
+            statement = statement.order_by(*relationship.order_by)
+        session = get_session(self.context)
+        related = {}
+        for row in session.execute(statement):
+            record, = record_class.from_rows(record_class.__slots__,
+                                             [row[1:]])
+            related.setdefault(row[0], []).append(record)
+        if relationship.uselist:
+            return Promise.resolve([related.get(k, []) for k in keys])
+        return Promise.resolve(
+            [next(iter(related.get(k, [])), None) for k in keys])
+
+
+def load_record_relationship(relationship, context, root):
+    key = get_parent_key(relationship, root)
+    if key is None:
+        return [] if relationship.uselist else None
+    loader = get_loader(
+        context, ('records', relationship),
+        lambda: RecordRelationshipLoader(relationship, context))
+    return loader.load(key)
@@ -5,6 +5,7 @@ class Registry(object):
         self._registry_composites = {}
         self._registry_attributes = {}
         self._registry_enums = {}
+        self._registry_shards = {}
 
     def __contains__(self, item):
         return item in self._registry_models or \
@@ -47,6 +48,16 @@ class Registry(object):
     def get_enum(self, enum):
         return self._registry_enums.get(enum)
 
+    def register_shards(self, model, shards, shard_key=None):
+        """Spreads the rows of `model` over `shards`, a mapping of shard
+        ids to engines or session factories. `shard_key(context)` selects
+        the shards queried by an operation, all of them by default"""
+        from .sharding import ShardConfig
+        self._registry_shards[model] = ShardConfig(shards, shard_key)
+
+    def get_shards(self, model):
+        return self._registry_shards.get(model)
+
 
 registry = None
 
@@ -3,23 +3,29 @@ from collections import OrderedDict
 from collections.abc import Iterable
 from functools import partial
 from graphene.relay.node import GlobalID
-from graphene.types import ID, List, Field, Interface, ObjectType, Argument
+from graphene.types import (ID, List, Field, Interface, NonNull, ObjectType,
+                            Argument, String)
 from graphene.types.base import BaseOptions, BaseType
 from graphene.types.utils import get_type
 from graphql.type.definition import GraphQLList
-from graphql_relay import from_global_id, to_global_id
-from inspect import isclass
+from inspect import isawaitable, isclass
 
 from .converter import (convert_model_to_attributes, get_attributes_fields,
                         FieldType)
 from .fields import default_connection_field_factory
+from .global_id import default_global_id_codec
+from .search import get_search_fields
+from .utils import get_indexed_fields
 
 
 class InterfaceOptions(BaseOptions):
     fields = None  # type: Dict[str, Field]
     filter_fields = None  # type: Dict[str, Field]
+    search_fields = None
+    indexed_fields = None
     query_filter = None
     model = None
+    global_id_codec = None
 
     def freeze(self):
         if 'pytest' in sys.modules:
@@ -60,6 +66,25 @@ class NodeField(Field):
         return partial(self.node_type.node_resolver, get_type(self.field_type))
 
 
+class NodesField(Field):
+    """List of the nodes of the `ids` argument, the nodes of a type are
+    loaded with a single query"""
+
+    def __init__(self, node, type=False, **kwargs):
+        assert issubclass(node, Node), "NodesField can only operate in Nodes"
+        self.node_type = node
+        self.field_type = type
+        super().__init__(
+            List(type or node),
+            description="The objects of the IDs",
+            ids=List(NonNull(ID), required=True),
+            **kwargs)
+
+    def get_resolver(self, parent_resolver):
+        return partial(self.node_type.nodes_resolver,
+                       get_type(self.field_type))
+
+
 class AbstractNode(Interface):
     class Meta:
         abstract = True
@@ -92,13 +117,25 @@ class Node(AbstractNode):
             type_cast=None,
             exclude_fields=None,
             filter_fields=None,
+            search_fields=None,
+            index_aware=False,
+            indexed_fields=None,
             query_filter=None,
             connection_field_factory=default_connection_field_factory,
+            global_id_codec=None,
             **options):
         assert model, 'Model not provided'
         _meta = InterfaceOptions(cls)
         _meta.model = model
+        _meta.global_id_codec = global_id_codec or default_global_id_codec
         _meta.query_filter = query_filter
+        _meta.search_fields = get_search_fields(search_fields)
+        if index_aware or indexed_fields:
+            _meta.indexed_fields = get_indexed_fields(model, indexed_fields)
+            if filter_fields:
+                filter_fields = ','.join(
+                    f for f in filter_fields.split(',')
+                    if f in _meta.indexed_fields)
 
         if filter_fields:
             _meta.filter_fields = {}
@@ -124,6 +161,11 @@ class Node(AbstractNode):
                     getattr(_meta.fields[n], 'type')
                 )
 
+        if _meta.search_fields:
+            if _meta.filter_fields is None:
+                _meta.filter_fields = {}
+            _meta.filter_fields['search'] = Argument(String)
+
         super().__init_subclass_with_meta__(
             _meta=_meta, **options)
 
@@ -132,6 +174,14 @@ class Node(AbstractNode):
         kwargs.update({'arguments': cls._meta.filter_fields})
         return NodeField(cls, *args, **kwargs)
 
+    @classmethod
+    def NodesField(cls, *args, **kwargs):  # noqa: N802
+        return NodesField(cls, *args, **kwargs)
+
+    @classmethod
+    def nodes_resolver(cls, only_type, root, info, ids):
+        return cls.get_nodes_from_global_ids(info, ids, only_type=only_type)
+
     @classmethod
     def node_resolver(cls, only_type, root, info, **kwargs):
         if 'id' not in kwargs:
@@ -153,14 +203,15 @@ class Node(AbstractNode):
             info,
             return_many=return_many,
             query_filter=_query,
+            search_fields=cls._meta.search_fields,
             **filter_fields)
 
     @classmethod
     def get_node_from_global_id(cls, info, global_id, only_type=None):
-        try:
-            _type, _id = cls.from_global_id(global_id)
-            graphene_type = info.schema.get_type(_type).graphene_type
-        except Exception:
+        _type, _id = cls.from_global_id(global_id)
+        graphene_type = getattr(
+            info.schema.get_type(_type), 'graphene_type', None)
+        if graphene_type is None:
             return None
 
         if only_type:
@@ -176,16 +227,57 @@ class Node(AbstractNode):
             return None
         return get_node(info, _id)
 
+    @classmethod
+    def get_nodes_from_global_ids(cls, info, global_ids, only_type=None):
+        """Returns the nodes of `global_ids` in their order, grouped by
+        type into one `get_nodes` call each"""
+        ids_for_type = OrderedDict()
+        for position, global_id in enumerate(global_ids):
+            _type, _id = cls.from_global_id(global_id)
+            graphene_type = getattr(
+                info.schema.get_type(_type), 'graphene_type', None)
+            if graphene_type is None or \
+                    cls not in graphene_type._meta.interfaces or \
+                    not hasattr(graphene_type, 'get_nodes'):
+                continue
+            if only_type:
+                assert graphene_type == only_type, f'Must receive a ' \
+                    f'{only_type._meta.name} id.'
+            ids_for_type.setdefault(graphene_type, []).append(
+                (position, _id))
+
+        nodes = [None] * len(global_ids)
+        pending = []
+        for graphene_type, ids in ids_for_type.items():
+            found = graphene_type.get_nodes(info, [i for _, i in ids])
+            if isawaitable(found):
+                pending.append((ids, found))
+                continue
+            for (position, _), node in zip(ids, found):
+                nodes[position] = node
+        if pending:
+            return cls._await_nodes(nodes, pending)
+        return nodes
+
+    @staticmethod
+    async def _await_nodes(nodes, pending):
+        for ids, found in pending:
+            for (position, _), node in zip(ids, await found):
+                nodes[position] = node
+        return nodes
+
+    @classmethod
+    def _get_global_id_codec(cls):
+        return getattr(cls._meta, 'global_id_codec', None) or \
+            default_global_id_codec
+
     @classmethod
     def from_global_id(cls, global_id):
-        try:
-            global_id = from_global_id(global_id)
-        except Exception as _:
-            pass
-        if isinstance(global_id, str):
-            global_id = (cls._meta.model.__name__, global_id)
-        return global_id
+        decoded = cls._get_global_id_codec().decode(global_id)
+        if decoded is None:
+            return cls._meta.model.__name__, global_id
+        return decoded
 
     @classmethod
     def to_global_id(cls, type, id):
-        return to_global_id(type, id)
+        return cls._get_global_id_codec().encode(type, id)
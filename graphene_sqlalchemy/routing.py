@@ -0,0 +1,78 @@
+import itertools
+import threading
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Delete, Insert, Update
+
+ROUTING_STRATEGIES = ('round_robin', 'least_busy')
+
+
+class ReplicaRouter(object):
+    """Chooses the engine of a session, writes go to `primary` and reads
+    to one of the `replicas`, round-robin or by the fewest connections
+    checked out of its pool"""
+
+    def __init__(self, primary, replicas=(), strategy='round_robin'):
+        assert strategy in ROUTING_STRATEGIES, \
+            f'strategy must be one of {ROUTING_STRATEGIES}, ' \
+            f'received "{strategy}"'
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.strategy = strategy
+        self._cycle = itertools.cycle(range(len(self.replicas)))
+        self._lock = threading.Lock()
+
+    def get_replica(self):
+        if not self.replicas:
+            return self.primary
+        with self._lock:
+            start = next(self._cycle)
+        replicas = self.replicas[start:] + self.replicas[:start]
+        if self.strategy == 'least_busy':
+            # Ties keep the round-robin order
+            return min(replicas, key=_checked_out)
+        return replicas[0]
+
+
+def _checked_out(engine):
+    checkedout = getattr(engine.pool, 'checkedout', None)
+    return checkedout() if callable(checkedout) else 0
+
+
+class RoutingSession(Session):
+    """Session reading from a replica of its router until it writes.
+    Flushes and DML statements go to the primary, after which the session
+    is pinned to the primary so later reads see its writes. The replica
+    is chosen once per session, so a request reuses its connection::
+
+        Session = sessionmaker(class_=RoutingSession,
+                               router=ReplicaRouter(primary, [replica]))
+    """
+
+    def __init__(self, router=None, **kwargs):
+        assert router, 'router not provided'
+        self.router = router
+        self.primary_pinned = False
+        self._replica = None
+        super().__init__(**kwargs)
+
+    def pin_primary(self):
+        self.primary_pinned = True
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.primary_pinned or self._flushing or \
+                isinstance(clause, (Insert, Update, Delete)):
+            return self.router.primary
+        if self._replica is None:
+            self._replica = self.router.get_replica()
+        return self._replica
+
+    def flush(self, objects=None):
+        if self._is_clean():
+            return
+        self.pin_primary()
+        super().flush(objects)
+
+    def close(self):
+        super().close()
+        self.primary_pinned = False
+        self._replica = None
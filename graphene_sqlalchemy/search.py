@@ -0,0 +1,147 @@
+import re
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.inspection import inspect
+
+from .utils import EnumValue
+
+# Marker stored in the sort enum, replaced by the rank expression of the
+# current search when the query is built
+RELEVANCE = EnumValue('relevance_desc', None)
+
+POSTGRES_SEARCH_CONFIG = 'english'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_search_fields(search_fields):
+    if not search_fields:
+        return ()
+    if isinstance(search_fields, str):
+        search_fields = search_fields.split(',')
+    return tuple(f.strip() for f in search_fields if f.strip())
+
+
+def get_fts_table_name(model):
+    return inspect(model).local_table.name + '_fts'
+
+
+def _dialect_name(query, model):
+    return query.session.get_bind(inspect(model)).dialect.name
+
+
+def _search_columns(model, search_fields):
+    return [getattr(model, n) for n in search_fields]
+
+
+def _sqlite_match_query(value):
+    # Quote every word so user input never reaches the FTS5 query syntax,
+    # which mirrors the behaviour of plainto_tsquery on Postgres
+    return ' '.join(f'"{w}"' for w in _WORD_RE.findall(value))
+
+
+def _postgres_config():
+    # Rendered inline so the expression matches a functional GIN index
+    return literal_column(f"'{POSTGRES_SEARCH_CONFIG}'::regconfig")
+
+
+def _postgres_document(model, search_fields):
+    columns = [func.coalesce(c, '') for c in
+               _search_columns(model, search_fields)]
+    return func.to_tsvector(_postgres_config(),
+                            func.concat_ws(' ', *columns))
+
+
+def _postgres_query(value):
+    return func.plainto_tsquery(_postgres_config(), value)
+
+
+def _sqlite_primary_key(model):
+    primary_key = inspect(model).primary_key
+    assert len(primary_key) == 1, \
+        f'Full-text search on SQLite requires a single column primary key ' \
+        f'for {model.__name__}'
+    return primary_key[0]
+
+
+def search_condition(model, search_fields, value, dialect):
+    if dialect == 'postgresql':
+        return _postgres_document(model, search_fields).op('@@')(
+            _postgres_query(value))
+    if dialect == 'sqlite':
+        fts = get_fts_table_name(model)
+        match = select([literal_column('rowid')]) \
+            .select_from(text(fts)) \
+            .where(literal_column(fts).op('MATCH')(
+                _sqlite_match_query(value)))
+        return _sqlite_primary_key(model).in_(match)
+    raise Exception(f'Full-text search is not supported for the '
+                    f'"{dialect}" dialect')
+
+
+def search_rank(model, search_fields, value, dialect):
+    """Returns an expression where a larger value means a better match"""
+    if dialect == 'postgresql':
+        return func.ts_rank(_postgres_document(model, search_fields),
+                            _postgres_query(value))
+    if dialect == 'sqlite':
+        fts = get_fts_table_name(model)
+        pk = _sqlite_primary_key(model)
+        # bm25() returns negative scores, lower is better
+        return -select([func.bm25(literal_column(fts))]) \
+            .select_from(text(fts)) \
+            .where(literal_column(fts).op('MATCH')(
+                _sqlite_match_query(value))) \
+            .where(literal_column(f'{fts}.rowid') == pk) \
+            .as_scalar()
+    raise Exception(f'Full-text search is not supported for the '
+                    f'"{dialect}" dialect')
+
+
+def apply_search(query, model, search_fields, value, sort=None):
+    """Filters the query by a full-text search over `search_fields` and
+    replaces the relevance marker in `sort` by the rank expression.
+    Returns the query and the list of sort expressions"""
+    sort = list(sort or [])
+    if not value or not search_fields:
+        return query, [s for s in sort if s.value is not None]
+    dialect = _dialect_name(query, model)
+    query = query.filter(
+        search_condition(model, search_fields, value, dialect))
+    order_by = []
+    for s in sort:
+        if s.value is None:
+            order_by.append(EnumValue(str(s), search_rank(
+                model, search_fields, value, dialect).desc()))
+        else:
+            order_by.append(s)
+    return query, order_by
+
+
+def create_sqlite_fts_table(model, search_fields, bind):
+    """Creates an external content FTS5 table for `model` and the triggers
+    keeping it in sync. Meant to run SQLite based setups locally"""
+    table = inspect(model).local_table.name
+    fts = get_fts_table_name(model)
+    pk = _sqlite_primary_key(model).name
+    search_fields = get_search_fields(search_fields)
+    columns = ', '.join(search_fields)
+    new_values = ', '.join(f'new.{c}' for c in search_fields)
+    old_values = ', '.join(f'old.{c}' for c in search_fields)
+    statements = (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{columns}, content='{table}', content_rowid='{pk}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} "
+        f"BEGIN INSERT INTO {fts}(rowid, {columns}) "
+        f"VALUES (new.{pk}, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} "
+        f"BEGIN INSERT INTO {fts}({fts}, rowid, {columns}) "
+        f"VALUES ('delete', old.{pk}, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} "
+        f"BEGIN INSERT INTO {fts}({fts}, rowid, {columns}) "
+        f"VALUES ('delete', old.{pk}, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {columns}) "
+        f"VALUES (new.{pk}, {new_values}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    )
+    for statement in statements:
+        bind.execute(text(statement))
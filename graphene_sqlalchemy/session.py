@@ -0,0 +1,93 @@
+import copy
+from contextlib import contextmanager
+from graphql.execution.base import ResolveInfo
+
+from .loaders import LOADERS_CONTEXT_KEY
+from .routing import RoutingSession
+from .transaction import UNIT_OF_WORK_CONTEXT_KEY
+from .utils import get_context_value, set_context_value
+
+# Key of the session manager of the current operation in the GraphQL
+# context
+SESSION_MANAGER_CONTEXT_KEY = '_graphene_sqlalchemy_session_manager'
+
+
+class RequestSession(object):
+    """Session of one GraphQL operation. It is opened on first use on a
+    single pooled connection, kept checked out across commits, so every
+    resolver of the operation reuses it, and released by `close`.
+    `session_factory` is a `sessionmaker`"""
+
+    def __init__(self, session_factory, bind=None):
+        self.session_factory = session_factory
+        self.bind = bind
+        self.connection = None
+        self.session = None
+        # Sessions of the shards queried by the operation
+        self.shard_sessions = {}
+
+    def get_session(self):
+        if self.session is None:
+            self.session = self.session_factory()
+            if isinstance(self.session, RoutingSession):
+                # The session keeps one connection per routed engine
+                return self.session
+            bind = self.bind if self.bind is not None \
+                else self.session.get_bind()
+            self.connection = bind.connect()
+            self.session.bind = self.connection
+        return self.session
+
+    def close(self):
+        for session in self.shard_sessions.values():
+            session.close()
+        self.shard_sessions = {}
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def get_request_session(context):
+    return get_context_value(context, SESSION_MANAGER_CONTEXT_KEY)
+
+
+@contextmanager
+def request_session(context, session_factory, bind=None):
+    """Scopes one session to a GraphQL operation, `get_session` and
+    `get_query` return it for every resolver and it is closed on exit::
+
+        with request_session(context, Session):
+            result = schema.execute(query, context_value=context)
+    """
+    manager = RequestSession(session_factory, bind)
+    set_context_value(context, SESSION_MANAGER_CONTEXT_KEY, manager)
+    try:
+        yield manager
+    finally:
+        manager.close()
+        set_context_value(context, SESSION_MANAGER_CONTEXT_KEY, None)
+
+
+def copy_info_with_session(info, session, **values):
+    """Returns `info` with a copy of its context where `session` is the
+    session of the resolvers, and `values` are set"""
+    context = info.context
+    if isinstance(context, dict):
+        context = dict(context)
+    else:
+        context = copy.copy(context)
+    # Loaders and units of work of the operation are bound to its
+    # session, they are left to the original context
+    for key in (LOADERS_CONTEXT_KEY, SESSION_MANAGER_CONTEXT_KEY,
+                UNIT_OF_WORK_CONTEXT_KEY):
+        set_context_value(context, key, None)
+    set_context_value(context, 'session', session)
+    for key, value in values.items():
+        set_context_value(context, key, value)
+    return ResolveInfo(
+        info.field_name, info.field_asts, info.return_type,
+        info.parent_type, info.schema, info.fragments, info.root_value,
+        info.operation, info.variable_values, context, info.path)
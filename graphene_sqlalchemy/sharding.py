@@ -0,0 +1,179 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from sqlalchemy.engine import Engine
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators
+
+from .session import copy_info_with_session, get_request_session
+from .utils import get_context_value
+
+# Id of the shard queried in a copy of the context made for it
+SHARD_CONTEXT_KEY = '_graphene_sqlalchemy_shard'
+# Sessions opened on the shards when no RequestSession manages them
+SHARD_SESSIONS_CONTEXT_KEY = '_graphene_sqlalchemy_shard_sessions'
+
+
+class ShardConfig(object):
+    """Maps the shard ids of a model to session factories. `shard_key`
+    receives the context and returns the id or the list of ids of the
+    shards to query, every shard is queried when it returns None"""
+
+    def __init__(self, shards, shard_key=None):
+        assert shards, 'At least one shard is required'
+        self.shards = {
+            shard_id: sessionmaker(bind=factory)
+            if isinstance(factory, Engine) else factory
+            for shard_id, factory in shards.items()}
+        self.shard_key = shard_key
+
+    def get_shard_ids(self, context):
+        shard_ids = self.shard_key(context) if self.shard_key else None
+        if shard_ids is None:
+            return list(self.shards)
+        if not isinstance(shard_ids, (list, tuple, set, frozenset)):
+            shard_ids = [shard_ids]
+        for shard_id in shard_ids:
+            assert shard_id in self.shards, f'Unknown shard "{shard_id}"'
+        return list(shard_ids)
+
+
+def get_shard_config(registry, model, context):
+    """Returns the shards of `model`, None when it isn't sharded or when
+    `context` is already bound to one of them"""
+    if get_context_value(context, SHARD_CONTEXT_KEY) is not None:
+        return None
+    return registry.get_shards(model)
+
+
+def get_shard_session(context, config, shard_id):
+    manager = get_request_session(context)
+    if manager is not None:
+        sessions = manager.shard_sessions
+    else:
+        sessions = get_context_value(context, SHARD_SESSIONS_CONTEXT_KEY, dict)
+    factory = config.shards[shard_id]
+    if (factory, shard_id) not in sessions:
+        sessions[(factory, shard_id)] = factory()
+    return sessions[(factory, shard_id)]
+
+
+def close_shard_sessions(context):
+    """Closes the shard sessions of an operation run without a
+    RequestSession"""
+    sessions = get_context_value(context, SHARD_SESSIONS_CONTEXT_KEY) or {}
+    for session in sessions.values():
+        session.close()
+    sessions.clear()
+
+
+def get_shard_infos(info, config):
+    """Returns a copy of `info` bound to the session of every shard
+    selected for the operation"""
+    return [
+        copy_info_with_session(
+            info, get_shard_session(info.context, config, shard_id),
+            **{SHARD_CONTEXT_KEY: shard_id})
+        for shard_id in config.get_shard_ids(info.context)]
+
+
+def fan_out(fn, items):
+    """Calls `fn` on every item in parallel, returns the results in the
+    order of the items"""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=len(items),
+                            thread_name_prefix='graphene_sqlalchemy_shard') \
+            as pool:
+        return list(pool.map(fn, items))
+
+
+class _SortKey(object):
+    """Orders the rows of the shards like the `ORDER BY` of their query,
+    NULLs come first in ascending order and last in descending order"""
+    __slots__ = ('values', 'descending')
+
+    def __init__(self, values, descending):
+        self.values = values
+        self.descending = descending
+
+    def __lt__(self, other):
+        for value, other_value, desc in zip(
+                self.values, other.values, self.descending):
+            if value == other_value:
+                continue
+            if value is None:
+                return not desc
+            if other_value is None:
+                return desc
+            return value > other_value if desc else value < other_value
+        return False
+
+
+def sort_columns(model, order_by):
+    """Returns the expressions ordering the rows, ended by the primary
+    key so every shard orders the ties in the same way, and whether they
+    are descending"""
+    columns = []
+    descending = []
+    for expression in order_by:
+        modifier = getattr(expression, 'modifier', None)
+        if modifier in (operators.asc_op, operators.desc_op):
+            columns.append(expression.element)
+            descending.append(modifier is operators.desc_op)
+        else:
+            columns.append(expression)
+            descending.append(False)
+    for column in inspect(model).primary_key:
+        columns.append(column)
+        descending.append(False)
+    return columns, descending
+
+
+def _shard_query(query, columns, descending):
+    labels = [c.label(f'_shard_sort_{i}') for i, c in enumerate(columns)]
+    # NULLs are ordered like _SortKey, MySQL and SQL Server lack the syntax
+    # but already put them first in ascending order
+    dialect = query.session.get_bind(
+        query.column_descriptions[0]['entity']).dialect
+    nulls = dialect.name not in ('mysql', 'mssql')
+    order_by = []
+    for column, desc in zip(columns, descending):
+        if desc:
+            order_by.append(column.desc().nullslast() if nulls
+                            else column.desc())
+        else:
+            order_by.append(column.asc().nullsfirst() if nulls
+                            else column.asc())
+    return query.order_by(None).add_columns(*labels).order_by(*order_by)
+
+
+def _count(query):
+    return query.order_by(None).count()
+
+
+def merge_shards(queries, columns, descending, stop=None, count=False):
+    """Runs the sorted `queries` of every shard in parallel, limited to
+    `stop` rows, and merges their results with a k-way heap merge.
+    Returns the merged rows and the total of rows when `count` is set"""
+    def fetch(query):
+        total = _count(query) if count else None
+        query = _shard_query(query, columns, descending)
+        if stop is not None:
+            query = query.limit(stop)
+        return total, query.all()
+
+    results = fan_out(fetch, queries)
+    merged = heapq.merge(
+        *(rows for _, rows in results),
+        key=lambda row: _SortKey(row[1:], descending))
+    items = [row[0] for row in islice(merged, stop)]
+    if not count:
+        return items, None
+    return items, sum(total for total, _ in results)
+
+
+def count_shards(queries):
+    return sum(fan_out(_count, queries))
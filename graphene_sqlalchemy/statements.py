@@ -0,0 +1,114 @@
+import sqlalchemy
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import bindparam, event, select
+from sqlalchemy.inspection import inspect
+from sqlalchemy.sql.expression import cast
+
+# Statements with a memoized cache key, SQLAlchemy 1.4 and later
+CACHEABLE_STATEMENTS = hasattr(sqlalchemy, 'lambda_stmt')
+
+try:
+    from sqlalchemy.engine.default import CACHE_HIT
+except ImportError:
+    # No compiled cache before SQLAlchemy 1.4
+    CACHE_HIT = None
+
+_STATEMENTS = {}
+_STATEMENTS_LOCK = threading.Lock()
+
+_resolver_type = ContextVar('graphene_sqlalchemy_resolver_type',
+                            default=None)
+
+
+def get_statement(key, factory):
+    """Returns the statement built once by `factory` for `key`. Values
+    are passed as bound parameters, so every execution reuses the same
+    statement object and its compiled form"""
+    statement = _STATEMENTS.get(key)
+    if statement is None:
+        with _STATEMENTS_LOCK:
+            statement = _STATEMENTS.setdefault(key, factory())
+    return statement
+
+
+def get_node_statement(model):
+    """`SELECT ... WHERE pk = :pk` for `model`, None when the installed
+    SQLAlchemy can't cache it or the primary key is composite"""
+    primary_key = inspect(model).primary_key
+    if not CACHEABLE_STATEMENTS or len(primary_key) != 1:
+        return None
+    return get_statement(('node', model), lambda: select(model).where(
+        primary_key[0] == bindparam('pk', type_=primary_key[0].type)))
+
+
+def get_filter_statement(model, fields, first=False):
+    """`SELECT ... WHERE field = CAST(:field)` for the sorted `fields` of
+    `model`, limited to one row when `first` is set. None when the
+    installed SQLAlchemy can't cache it"""
+    if not CACHEABLE_STATEMENTS:
+        return None
+
+    def factory():
+        columns = [getattr(model, f) for f in fields]
+        statement = select(model).where(*(
+            c == cast(bindparam(f), c.type) for f, c in zip(fields, columns)))
+        return statement.limit(1) if first else statement
+    return get_statement(('filter', model, tuple(fields), first), factory)
+
+
+class CompiledCacheStats(object):
+    """Compiled cache hits and misses of the statements executed by each
+    resolver type"""
+
+    def __init__(self):
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, resolver_type, hit):
+        with self._lock:
+            (self.hits if hit else self.misses)[resolver_type] += 1
+
+    def hit_rate(self, resolver_type):
+        total = self.hits[resolver_type] + self.misses[resolver_type]
+        return self.hits[resolver_type] / total if total else None
+
+    def as_dict(self):
+        return {t: {'hits': self.hits[t], 'misses': self.misses[t],
+                    'hit_rate': self.hit_rate(t)}
+                for t in set(self.hits) | set(self.misses)}
+
+    def reset(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+compiled_cache_stats = CompiledCacheStats()
+
+
+@contextmanager
+def resolver_type(name):
+    """Attributes the statements executed in the block to `name`"""
+    token = _resolver_type.set(name)
+    try:
+        yield
+    finally:
+        _resolver_type.reset(token)
+
+
+def track_compiled_cache(engine, stats=compiled_cache_stats):
+    """Counts the compiled cache hits of the statements executed on
+    `engine` in `stats`, per resolver type"""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if CACHE_HIT is None or getattr(context, 'compiled', None) is None:
+            return
+        stats.record(_resolver_type.get() or 'other',
+                     context.cache_hit is CACHE_HIT)
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return stats
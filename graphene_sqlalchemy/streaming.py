@@ -0,0 +1,187 @@
+from graphql import parse
+from graphql.error import format_error as default_format_error
+from graphql.execution.executor import complete_value
+from graphql.execution.executors.sync import SyncExecutor
+from graphql.execution.utils import ExecutionContext
+from graphql.execution.values import get_argument_values
+from graphql.type import GraphQLArgument, GraphQLInt
+from graphql.type.directives import (DirectiveLocation, GraphQLDirective,
+                                     specified_directives)
+from graphql_relay.connection.arrayconnection import offset_to_cursor
+from itertools import islice
+from promise import is_thenable, Promise
+
+from .utils import get_context_value, set_context_value
+
+# Key of the streams registered by the connections of an operation, only
+# set while execute_incremental runs one
+STREAMS_CONTEXT_KEY = '_graphene_sqlalchemy_streams'
+
+DEFAULT_BATCH_SIZE = 100
+
+GraphQLStreamDirective = GraphQLDirective(
+    name='stream',
+    description='Delivers the edges of a connection in batches after the '
+                'first response.',
+    args={
+        'initialCount': GraphQLArgument(
+            GraphQLInt, default_value=0,
+            description='Edges sent in the first response.'),
+        'batchSize': GraphQLArgument(
+            GraphQLInt, default_value=DEFAULT_BATCH_SIZE,
+            description='Edges sent in every following response.'),
+    },
+    locations=[DirectiveLocation.FIELD])
+
+# Directives of a schema streaming connections, passed to graphene.Schema
+STREAM_DIRECTIVES = list(specified_directives) + [GraphQLStreamDirective]
+
+
+class _Stream(object):
+
+    def __init__(self, info, connection_type, field_asts, field_type, path,
+                 nodes, start, offset, batch_size):
+        self.info = info
+        self.connection_type = connection_type
+        self.field_asts = field_asts
+        self.field_type = field_type
+        self.path = path
+        self.nodes = nodes
+        # Offset of the first edge of the page and index of the next edge
+        self.start = start
+        self.offset = offset
+        self.batch_size = batch_size
+
+    def close(self):
+        # Releases the cursor of a page that isn't read to its end
+        close = getattr(self.nodes, 'close', None)
+        if close is not None:
+            close()
+
+    def batches(self):
+        while True:
+            batch = list(islice(self.nodes, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+def get_stream_arguments(info):
+    """Returns the `edges` field of the connection resolved with `info`,
+    the initial count and the batch size of its @stream directive, None
+    when it isn't streamed or the operation isn't run by
+    execute_incremental"""
+    if get_context_value(info.context, STREAMS_CONTEXT_KEY) is None:
+        return None
+    field_ast = next(iter(info.field_asts), None)
+    for selection in getattr(field_ast.selection_set, 'selections', ()):
+        if getattr(selection, 'name', None) is None or \
+                selection.name.value != 'edges':
+            continue
+        for directive in selection.directives or ():
+            if directive.name.value != GraphQLStreamDirective.name:
+                continue
+            arguments = get_argument_values(
+                GraphQLStreamDirective.args, directive.arguments,
+                info.variable_values)
+            return (selection,
+                    max(arguments.get('initialCount') or 0, 0),
+                    max(arguments.get('batchSize') or DEFAULT_BATCH_SIZE, 1))
+    return None
+
+
+def register_stream(info, connection_type, edges_ast, nodes, start, offset,
+                    batch_size):
+    """Stores the iterator over the remaining `nodes` of a page starting
+    at `start`, of which `offset` were sent in the first response"""
+    key = (edges_ast.alias or edges_ast.name).value
+    return_type = info.return_type
+    while hasattr(return_type, 'of_type'):
+        return_type = return_type.of_type
+    stream = _Stream(
+        info, connection_type, [edges_ast],
+        return_type.fields['edges'].type, list(info.path) + [key], nodes,
+        start, offset, batch_size)
+    get_context_value(info.context, STREAMS_CONTEXT_KEY).append(stream)
+
+
+def execute_incremental(schema, request_string, context_value=None,
+                        variable_values=None, operation_name=None,
+                        root_value=None, middleware=None,
+                        format_error=default_format_error):
+    """Executes an operation and yields its payloads: the result with the
+    first edges of the connections whose `edges` are marked with @stream,
+    then a payload per batch of the remaining edges, loaded from the
+    database as they are sent. Every payload tells with `hasNext` if more
+    follow"""
+    if context_value is None:
+        context_value = {}
+    set_context_value(context_value, STREAMS_CONTEXT_KEY, [])
+    result = schema.execute(
+        request_string, context_value=context_value,
+        variable_values=variable_values, operation_name=operation_name,
+        root_value=root_value, middleware=middleware)
+    streams = get_context_value(context_value, STREAMS_CONTEXT_KEY)
+    set_context_value(context_value, STREAMS_CONTEXT_KEY, None)
+    if result.invalid or result.data is None:
+        _close_streams(streams)
+        streams = []
+    try:
+        payload = result.to_dict(format_error=format_error)
+        payload['hasNext'] = bool(streams)
+        yield payload
+        if not streams:
+            return
+
+        exe_context = ExecutionContext(
+            schema, parse(request_string), root_value, context_value,
+            variable_values or {}, operation_name, SyncExecutor(),
+            middleware, False)
+        pending = [(stream, stream.batches()) for stream in streams]
+        # The next batch is read ahead to know whether more payloads follow
+        current = _next_batch(pending)
+        while current is not None:
+            following = _next_batch(pending)
+            stream, batch, index = current
+            items = _complete_edges(exe_context, stream, batch, index)
+            payload = {'incremental': [
+                {'items': items, 'path': stream.path + [index]}]}
+            if exe_context.errors:
+                payload['incremental'][0]['errors'] = [
+                    format_error(e) for e in exe_context.errors]
+                exe_context.errors = []
+            payload['hasNext'] = following is not None
+            yield payload
+            current = following
+    finally:
+        # The client may stop reading before the last payload
+        _close_streams(streams)
+
+
+def _close_streams(streams):
+    for stream in streams:
+        stream.close()
+
+
+def _next_batch(pending):
+    while pending:
+        stream, batches = pending[0]
+        batch = next(batches, None)
+        if batch is not None:
+            index = stream.offset
+            stream.offset += len(batch)
+            return stream, batch, index
+        pending.pop(0)
+    return None
+
+
+def _complete_edges(exe_context, stream, nodes, index):
+    edge_type = stream.connection_type.Edge
+    edges = [edge_type(node=node, cursor=offset_to_cursor(stream.start + i))
+             for i, node in enumerate(nodes, index)]
+    items = complete_value(
+        exe_context, stream.field_type, stream.field_asts, stream.info,
+        stream.path, edges)
+    if is_thenable(items):
+        items = Promise.resolve(items).get()
+    return items
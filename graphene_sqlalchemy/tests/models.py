@@ -62,6 +62,44 @@ class Article(Base):
     reporter_id = Column(Integer(), ForeignKey("reporters.id"))
 
 
+employee_tags = Table(
+    "employee_tags",
+    Base.metadata,
+    Column("employee_id", Integer, ForeignKey("employees.id")),
+    Column("tag_id", Integer, ForeignKey("tags.id")),
+)
+
+
+class SerializableMixin(object):
+    """The mutations read the written rows with `as_dict`"""
+
+    def as_dict(self, selection=None):
+        return {c.key: getattr(self, c.key) for c in self.__table__.columns
+                if selection is None or c.key in selection}
+
+
+class Department(SerializableMixin, Base):
+    __tablename__ = "departments"
+    id = Column(Integer(), primary_key=True)
+    name = Column(String(50))
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    id = Column(Integer(), primary_key=True)
+    name = Column(String(50))
+
+
+class Employee(SerializableMixin, Base):
+    __tablename__ = "employees"
+    id = Column(Integer(), primary_key=True)
+    name = Column(String(50))
+    department_id = Column(Integer(), ForeignKey("departments.id"))
+    department = relationship(
+        "Department", foreign_keys=[department_id], backref="employees")
+    tags = relationship("Tag", secondary=employee_tags)
+
+
 class ReflectedEditor(type):
     """Same as Editor, but using reflected table."""
 
@@ -0,0 +1,159 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import graphene
+
+from ..fields import ConnectionField, GroupByConnectionField
+from ..registry import reset_global_registry
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Department as DepartmentModel
+from .models import Employee as EmployeeModel
+
+
+@pytest.fixture(scope="function")
+def session():
+    reset_global_registry()
+    connection = create_engine("sqlite://").connect()
+    Base.metadata.create_all(connection)
+    session = sessionmaker(bind=connection)()
+    session.add_all([
+        DepartmentModel(id=1, name="Sales"),
+        DepartmentModel(id=2, name="IT"),
+        EmployeeModel(id=1, name="ABA", department_id=1),
+        EmployeeModel(id=2, name="ABO", department_id=1),
+        EmployeeModel(id=3, name="ABU", department_id=2),
+        EmployeeModel(id=4, name="ABE"),
+    ])
+    session.commit()
+
+    yield session
+
+    session.close()
+    connection.close()
+
+
+def create_employee_type(**meta):
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+
+    return type("Employee", (ObjectType,), {"Meta": type("Meta", (), dict(
+        model=EmployeeModel, interfaces=(EmployeeNode,), **meta))})
+
+
+def create_schema(employee_type):
+    class Query(graphene.ObjectType):
+        employees = ConnectionField(employee_type._meta.connection)
+
+    return graphene.Schema(query=Query, types=[employee_type])
+
+
+def test_aggregate_connection(session):
+    schema = create_schema(create_employee_type(aggregates=True))
+    result = schema.execute("""
+        {
+          employees(first: 1) {
+            edges {
+              node {
+                name
+              }
+            }
+            aggregate {
+              count
+              sum { department_id }
+              avg { department_id }
+              min { department_id }
+              max { department_id }
+            }
+          }
+        }
+    """, context_value={"session": session})
+    assert not result.errors
+    employees = result.data["employees"]
+    # The aggregates cover the whole query, not the page
+    assert employees["edges"] == [{"node": {"name": "ABA"}}]
+    assert employees["aggregate"] == {
+        "count": 4,
+        "sum": {"department_id": 4.0},
+        "avg": {"department_id": 4 / 3},
+        "min": {"department_id": 1},
+        "max": {"department_id": 2},
+    }
+
+
+def test_aggregate_connection_with_fragments(session):
+    schema = create_schema(create_employee_type(aggregates=True))
+    result = schema.execute("""
+        {
+          employees {
+            aggregate {
+              count
+              ...Bounds
+            }
+          }
+        }
+
+        fragment Bounds on EmployeeAggregate {
+          min { department_id }
+          max { department_id }
+        }
+    """, context_value={"session": session})
+    assert not result.errors
+    assert result.data["employees"]["aggregate"] == {
+        "count": 4, "min": {"department_id": 1}, "max": {"department_id": 2}}
+
+
+def test_aggregate_only_on_request():
+    employee_type = create_employee_type()
+    assert "aggregate" not in employee_type._meta.connection._meta.fields
+
+
+def test_group_by_connection(session):
+    employee_type = create_employee_type()
+
+    class Query(graphene.ObjectType):
+        employee_groups = GroupByConnectionField(employee_type)
+
+    schema = graphene.Schema(query=Query, types=[employee_type])
+    query = """
+        query ($after: String) {
+          employeeGroups(groupBy: [department_id], first: 2, after: $after) {
+            pageInfo {
+              hasNextPage
+            }
+            edges {
+              node {
+                key { department_id }
+                aggregate {
+                  count
+                  max { department_id }
+                }
+              }
+            }
+          }
+        }
+    """
+    result = schema.execute(query, context_value={"session": session})
+    assert not result.errors
+    groups = result.data["employeeGroups"]
+    assert groups["pageInfo"] == {"hasNextPage": True}
+    # NULL sorts first on SQLite
+    assert [e["node"] for e in groups["edges"]] == [
+        {"key": {"department_id": None},
+         "aggregate": {"count": 1, "max": {"department_id": None}}},
+        {"key": {"department_id": 1},
+         "aggregate": {"count": 2, "max": {"department_id": 1}}},
+    ]
+
+    result = schema.execute(
+        query, variable_values={"after": "YXJyYXljb25uZWN0aW9uOjE="},
+        context_value={"session": session})
+    assert not result.errors
+    groups = result.data["employeeGroups"]
+    assert groups["pageInfo"] == {"hasNextPage": False}
+    assert [e["node"] for e in groups["edges"]] == [
+        {"key": {"department_id": 2},
+         "aggregate": {"count": 1, "max": {"department_id": 2}}},
+    ]
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from graphql.execution.executors.asyncio import AsyncioExecutor
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import graphene
+
+from ..fields import ConnectionField
+from ..registry import reset_global_registry
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Department as DepartmentModel
+from .models import Employee as EmployeeModel
+
+asyncio_ext = pytest.importorskip("sqlalchemy.ext.asyncio")
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture(scope="function")
+def engine(tmp_path):
+    path = tmp_path / "db.sqlite"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    session = sessionmaker(bind=sync_engine)()
+    session.add_all([
+        DepartmentModel(id=1, name="Sales"),
+        DepartmentModel(id=2, name="IT"),
+        EmployeeModel(id=1, name="ABA", department_id=1),
+        EmployeeModel(id=2, name="ABO", department_id=2),
+        EmployeeModel(id=3, name="ABU", department_id=1),
+    ])
+    session.commit()
+    session.close()
+    sync_engine.dispose()
+    return asyncio_ext.create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+
+@pytest.fixture(scope="function")
+def schema():
+    reset_global_registry()
+
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+
+    class Employee(ObjectType):
+        class Meta:
+            model = EmployeeModel
+            interfaces = (EmployeeNode,)
+            aggregates = True
+
+    class DepartmentNode(Node):
+        class Meta:
+            model = DepartmentModel
+
+    class Department(ObjectType):
+        class Meta:
+            model = DepartmentModel
+            interfaces = (DepartmentNode,)
+
+    class Query(graphene.ObjectType):
+        employees = ConnectionField(Employee._meta.connection)
+
+    return graphene.Schema(query=Query, types=[Employee, Department])
+
+
+def execute(engine, schema, query):
+    async def run():
+        async with asyncio_ext.AsyncSession(engine) as session:
+            return await schema.execute(
+                query, context_value={"session": session},
+                executor=AsyncioExecutor(), return_promise=True)
+    return asyncio.run(run())
+
+
+def test_async_connection(engine, schema):
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    result = execute(engine, schema, """
+        {
+          employees(first: 2) {
+            edges {
+              node {
+                name
+                department {
+                  name
+                }
+              }
+            }
+          }
+        }
+    """)
+    assert not result.errors
+    assert [e["node"] for e in result.data["employees"]["edges"]] == [
+        {"name": "ABA", "department": {"name": "Sales"}},
+        {"name": "ABO", "department": {"name": "IT"}},
+    ]
+    # The departments are loaded in one batch
+    assert len(statements) == 3
+
+
+def test_async_connection_aggregates_whole_query(engine, schema):
+    result = execute(engine, schema, """
+        {
+          employees(first: 1) {
+            edges {
+              node {
+                name
+              }
+            }
+            aggregate {
+              count
+              max { department_id }
+            }
+          }
+        }
+    """)
+    assert not result.errors
+    assert result.data["employees"] == {
+        "edges": [{"node": {"name": "ABA"}}],
+        "aggregate": {"count": 3, "max": {"department_id": 2}},
+    }
@@ -0,0 +1,107 @@
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine, event
+from sqlalchemy.dialects import mssql, sqlite
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+import graphene
+
+from ..registry import reset_global_registry
+from ..types import Node, ObjectType
+from ..utils import primary_key_filter
+
+Base = declarative_base()
+
+
+class Seat(Base):
+    __tablename__ = "seats"
+    number = Column(Integer(), primary_key=True)
+    letter = Column(String(1), primary_key=True)
+    name = Column(String(30))
+
+
+@pytest.fixture(scope="function")
+def session():
+    reset_global_registry()
+    connection = create_engine("sqlite://").connect()
+    Base.metadata.create_all(connection)
+    session = sessionmaker(bind=connection)()
+    session.add_all([
+        Seat(number=1, letter="A", name="1A"),
+        Seat(number=1, letter="B", name="1B"),
+        Seat(number=2, letter="A", name="2A"),
+    ])
+    session.commit()
+
+    yield session
+
+    session.close()
+    connection.close()
+
+
+@pytest.fixture(scope="function")
+def schema():
+    class SeatNode(Node):
+        class Meta:
+            model = Seat
+
+    class Seat_(ObjectType):
+        class Meta:
+            model = Seat
+            name = "Seat"
+            interfaces = (SeatNode,)
+
+    class Query(graphene.ObjectType):
+        seat = SeatNode.Field(Seat_)
+        seats = SeatNode.NodesField(Seat_)
+
+    return graphene.Schema(query=Query, types=[Seat_])
+
+
+def to_global_id(*key):
+    return Node.to_global_id("Seat", key)
+
+
+def test_get_composite_key_node(session, schema):
+    query = "query ($id: ID!) { seat(id: $id) { id name } }"
+    global_id = to_global_id(1, "B")
+    result = schema.execute(query, variable_values={"id": global_id},
+                            context_value={"session": session})
+    assert not result.errors
+    assert result.data == {"seat": {"id": global_id, "name": "1B"}}
+
+    for global_id in (to_global_id(1), Node.to_global_id("Seat", "1")):
+        result = schema.execute(query, variable_values={"id": global_id},
+                                context_value={"session": session})
+        assert not result.errors
+        assert result.data == {"seat": None}
+
+
+def test_composite_key_nodes_in_one_query(session, schema):
+    statements = []
+    event.listen(session.bind, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    ids = [to_global_id(2, "A"), to_global_id(3, "A"), to_global_id(1),
+           to_global_id(1, "A")]
+    result = schema.execute(
+        "query ($ids: [ID!]!) { seats(ids: $ids) { name } }",
+        variable_values={"ids": ids}, context_value={"session": session})
+    assert not result.errors
+    assert result.data == {
+        "seats": [{"name": "2A"}, None, None, {"name": "1A"}]}
+    assert len(statements) == 1
+    assert "WHERE (seats.number, seats.letter) IN" in statements[0]
+
+
+def test_primary_key_filter():
+    keys = [(1, "A"), (2, "B")]
+    sql = str(primary_key_filter(Seat, keys, sqlite.dialect()).compile(
+        dialect=sqlite.dialect()))
+    assert sql.startswith("(seats.number, seats.letter) IN")
+
+    # SQL Server has no row values
+    sql = str(primary_key_filter(Seat, keys, mssql.dialect()).compile(
+        dialect=mssql.dialect()))
+    assert sql == (
+        "seats.number = :number_1 AND seats.letter = :letter_1 OR "
+        "seats.number = :number_2 AND seats.letter = :letter_2")
@@ -0,0 +1,113 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+import graphene
+
+from ..executor import ParallelExecutor
+from ..fields import ConnectionField
+from ..registry import reset_global_registry
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Employee as EmployeeModel
+
+
+@pytest.fixture(scope="function")
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'db.sqlite'}", poolclass=QueuePool,
+        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([EmployeeModel(id=i, name=f"e{i}") for i in range(1, 4)])
+    session.commit()
+    session.close()
+    return engine
+
+
+@pytest.fixture(scope="function")
+def schema():
+    reset_global_registry()
+
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+
+    class Employee(ObjectType):
+        class Meta:
+            model = EmployeeModel
+            interfaces = (EmployeeNode,)
+
+    class Query(graphene.ObjectType):
+        first_employees = ConnectionField(Employee._meta.connection)
+        last_employees = ConnectionField(Employee._meta.connection)
+        hello = graphene.String(resolver=lambda root, info: "hi")
+
+    return graphene.Schema(query=Query, types=[Employee])
+
+
+QUERY = """
+    {
+      hello
+      first_employees: firstEmployees(first: 1) {
+        edges {
+          node {
+            name
+          }
+        }
+      }
+      last_employees: lastEmployees(last: 1) {
+        edges {
+          node {
+            name
+          }
+        }
+      }
+    }
+"""
+
+DATA = {
+    "hello": "hi",
+    "first_employees": {"edges": [{"node": {"name": "e1"}}]},
+    "last_employees": {"edges": [{"node": {"name": "e3"}}]},
+}
+
+
+def test_parallel_root_fields(engine, schema):
+    Session = sessionmaker(bind=engine)
+    threads = set()
+    event.listen(engine, "before_cursor_execute", lambda *args: threads.add(
+        threading.current_thread().name))
+
+    with ParallelExecutor(Session) as executor:
+        for _ in range(2):
+            threads.clear()
+            result = schema.execute(
+                QUERY, context_value={"session": None}, executor=executor)
+            assert not result.errors
+            assert result.data == DATA
+            assert threads and all(
+                t.startswith("graphene_sqlalchemy") for t in threads)
+            assert engine.pool.checkedout() == 0
+    with pytest.raises(RuntimeError):
+        executor.pool.submit(print)
+
+
+def test_parallel_executor_shared_by_concurrent_operations(engine, schema):
+    Session = sessionmaker(bind=engine)
+    executor = ParallelExecutor(Session, max_workers=2)
+
+    def execute(_):
+        return schema.execute(
+            QUERY, context_value={"session": None}, executor=executor)
+
+    with ThreadPoolExecutor(max_workers=4) as requests:
+        results = list(requests.map(execute, range(8)))
+    executor.shutdown()
+    assert all(not r.errors and r.data == DATA for r in results)
+    assert engine.pool.checkedout() == 0
+
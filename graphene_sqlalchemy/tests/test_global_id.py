@@ -0,0 +1,99 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import graphene
+from graphql_relay import from_global_id, to_global_id
+
+from ..global_id import (COMPACT_PREFIX, GlobalIDCodec,
+                         decode_composite_key, encode_composite_key)
+from ..registry import reset_global_registry
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Reporter as ReporterModel
+
+
+def test_standard_ids_match_graphql_relay():
+    codec = GlobalIDCodec()
+    for type_name in ("A", "Ab", "Abc", "Reporter", "Ünïcode"):
+        for id in (1, 1234567, "x", "a:b", ""):
+            global_id = codec.encode(type_name, id)
+            assert global_id == to_global_id(type_name, id)
+            assert codec.decode(global_id) == (type_name, str(id))
+            assert from_global_id(global_id) == (type_name, str(id))
+
+
+def test_compact_ids():
+    codec = GlobalIDCodec(types=["Reporter", "Article"], compact=True)
+    for id in (0, 1, 127, 128, 2 ** 40):
+        global_id = codec.encode("Article", id)
+        assert global_id.startswith(COMPACT_PREFIX)
+        assert codec.decode(global_id) == ("Article", id)
+    assert len(codec.encode("Reporter", 1000)) < \
+        len(to_global_id("Reporter", 1000))
+
+    # The types not listed, string and negative keys keep the standard
+    # format, which is decoded too
+    for type_name, id in (("Pet", 1), ("Reporter", "x"), ("Reporter", -1)):
+        global_id = codec.encode(type_name, id)
+        assert global_id == to_global_id(type_name, id)
+        assert codec.decode(global_id) == (type_name, str(id))
+
+    # A compact id of a type this codec doesn't list
+    other = GlobalIDCodec(types=["Reporter"], compact=True)
+    assert other.decode(codec.encode("Article", 1)) == (None, 1)
+
+
+def test_malformed_ids_decode_to_none():
+    codec = GlobalIDCodec(types=["Reporter"], compact=True)
+    for global_id in (None, 1, "", "abc", "a=b=", "YWJj====", "é" * 4,
+                      to_global_id("Reporter", 1)[:-1] + "!",
+                      "YWJj",  # "abc", without a separator
+                      COMPACT_PREFIX, COMPACT_PREFIX + "gA",
+                      COMPACT_PREFIX + "AAAA", COMPACT_PREFIX + "A"):
+        assert codec.decode(global_id) is None, global_id
+
+
+def test_composite_keys():
+    codec = GlobalIDCodec()
+    global_id = codec.encode("Pair", (1, "a:b"))
+    assert codec.decode(global_id) == ("Pair", '[1,"a:b"]')
+    assert decode_composite_key('[1,"a:b"]', 2) == (1, "a:b")
+    assert decode_composite_key(encode_composite_key((1, 2)), 2) == (1, 2)
+    for id in ("1", "[1]", "[1,2,3]", "[1,", "[[1],2]", '{"a":1}', 1):
+        assert decode_composite_key(id, 2) is None, id
+
+
+def test_node_uses_its_codec():
+    reset_global_registry()
+    codec = GlobalIDCodec(types=["Reporter"], compact=True)
+
+    class ReporterNode(Node):
+        class Meta:
+            model = ReporterModel
+            global_id_codec = codec
+
+    class Reporter(ObjectType):
+        class Meta:
+            model = ReporterModel
+            interfaces = (ReporterNode,)
+
+    global_id = ReporterNode.to_global_id("Reporter", 1)
+    assert global_id == codec.encode("Reporter", 1)
+    assert ReporterNode.from_global_id(global_id) == ("Reporter", 1)
+    # Ids that can't be decoded are taken as keys of the model of the node
+    assert ReporterNode.from_global_id("1") == ("Reporter", "1")
+
+    class Query(graphene.ObjectType):
+        reporter = ReporterNode.Field(Reporter)
+
+    session = sessionmaker(bind=create_engine("sqlite://"))()
+    Base.metadata.create_all(session.bind)
+    session.add(ReporterModel(id=1, first_name="ABA"))
+    session.commit()
+    schema = graphene.Schema(query=Query, types=[Reporter])
+    result = schema.execute(
+        "query ($id: ID!) { reporter(id: $id) { id first_name } }",
+        variable_values={"id": global_id}, context_value={"session": session})
+    assert not result.errors
+    assert result.data == {
+        "reporter": {"id": global_id, "first_name": "ABA"}}
@@ -0,0 +1,208 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import graphene
+
+from ..fields import ConnectionField
+from ..registry import reset_global_registry
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Department as DepartmentModel
+from .models import Employee as EmployeeModel
+from .models import Tag as TagModel
+
+
+@pytest.fixture(scope="function")
+def engine():
+    return create_engine("sqlite://")
+
+
+@pytest.fixture(scope="function")
+def session(engine):
+    reset_global_registry()
+    connection = engine.connect()
+    Base.metadata.create_all(connection)
+    session = sessionmaker(bind=connection)()
+    tags = [TagModel(id=1, name="a"), TagModel(id=2, name="b")]
+    session.add_all([
+        DepartmentModel(id=1, name="Sales"),
+        DepartmentModel(id=2, name="IT"),
+        DepartmentModel(id=3, name="HR"),
+        EmployeeModel(id=1, name="ABA", department_id=1, tags=tags),
+        EmployeeModel(id=2, name="ABO", department_id=1, tags=tags[:1]),
+        EmployeeModel(id=3, name="ABU", department_id=2),
+    ])
+    session.commit()
+
+    yield session
+
+    session.close()
+    connection.close()
+
+
+def track(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    return statements
+
+
+def create_schema(employee_meta=None, department_meta=None):
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+
+    class DepartmentNode(Node):
+        class Meta:
+            model = DepartmentModel
+
+    def create_type(name, model, node, meta):
+        return type(name, (ObjectType,), {"Meta": type("Meta", (), dict(
+            model=model, interfaces=(node,), **(meta or {})))})
+
+    employee_type = create_type(
+        "Employee", EmployeeModel, EmployeeNode, employee_meta)
+    department_type = create_type(
+        "Department", DepartmentModel, DepartmentNode, department_meta)
+
+    class Query(graphene.ObjectType):
+        employees = ConnectionField(employee_type._meta.connection)
+        departments = ConnectionField(department_type._meta.connection)
+
+    return graphene.Schema(
+        query=Query, types=[employee_type, department_type])
+
+
+def test_relationship_counts(engine, session):
+    schema = create_schema(
+        employee_meta={"relationship_counts": True},
+        department_meta={"relationship_counts": ("employees",)})
+    statements = track(engine)
+    result = schema.execute("""
+        {
+          departments {
+            edges {
+              node {
+                name
+                employeesCount
+              }
+            }
+          }
+          employees {
+            edges {
+              node {
+                name
+                tagsCount
+              }
+            }
+          }
+        }
+    """, context_value={"session": session})
+    assert not result.errors
+    assert [e["node"] for e in result.data["departments"]["edges"]] == [
+        {"name": "Sales", "employeesCount": 2},
+        {"name": "IT", "employeesCount": 1},
+        {"name": "HR", "employeesCount": 0},
+    ]
+    assert [e["node"] for e in result.data["employees"]["edges"]] == [
+        {"name": "ABA", "tagsCount": 2},
+        {"name": "ABO", "tagsCount": 1},
+        {"name": "ABU", "tagsCount": 0},
+    ]
+    # One count and one select statement per connection, one statement
+    # per counted relationship
+    assert len(statements) == 6
+
+
+def test_relationship_counts_only_on_request():
+    schema = create_schema(
+        department_meta={"relationship_counts": ("employees",)})
+    employee_fields = schema.get_type("Employee").fields
+    department_fields = schema.get_type("Department").fields
+    assert "tagsCount" not in employee_fields
+    assert "employeesCount" in department_fields
+
+
+def test_sort_by_related_columns_and_relationship_sizes(session):
+    schema = create_schema(
+        employee_meta={"related_sort": True},
+        department_meta={"related_sort": True})
+    result = schema.execute("""
+        {
+          departments(sort: [employees_count_desc, id_asc]) {
+            edges {
+              node {
+                name
+              }
+            }
+          }
+          employees(sort: [department_name_asc, tags_count_asc]) {
+            edges {
+              node {
+                name
+              }
+            }
+          }
+        }
+    """, context_value={"session": session})
+    assert not result.errors
+    assert [e["node"]["name"] for e in
+            result.data["departments"]["edges"]] == ["Sales", "IT", "HR"]
+    assert [e["node"]["name"] for e in
+            result.data["employees"]["edges"]] == ["ABU", "ABO", "ABA"]
+
+
+def test_resolvers_of_relationships_take_precedence(session):
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+
+    class Employee(ObjectType):
+        class Meta:
+            model = EmployeeModel
+            interfaces = (EmployeeNode,)
+
+        def resolve_department(root, info):
+            return DepartmentModel(id=9, name="Custom")
+
+    class DepartmentNode(Node):
+        class Meta:
+            model = DepartmentModel
+
+    class Department(ObjectType):
+        class Meta:
+            model = DepartmentModel
+            interfaces = (DepartmentNode,)
+
+        def resolve_employees(root, info, **args):
+            return [e for e in root.employees if e.name != "ABA"]
+
+    class Query(graphene.ObjectType):
+        departments = ConnectionField(Department._meta.connection)
+
+    schema = graphene.Schema(query=Query, types=[Employee, Department])
+    result = schema.execute("""
+        {
+          departments(first: 1) {
+            edges {
+              node {
+                employees {
+                  edges {
+                    node {
+                      name
+                      department {
+                        name
+                      }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+    """, context_value={"session": session})
+    assert not result.errors
+    department = result.data["departments"]["edges"][0]["node"]
+    assert [e["node"] for e in department["employees"]["edges"]] == [
+        {"name": "ABO", "department": {"name": "Custom"}}]
@@ -0,0 +1,468 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import graphene
+from graphene.types.base import BaseOptions
+
+from ..idempotency import (IdempotencyStore, MemoryIdempotencyStore, MISSING,
+                           SQLIdempotencyStore)
+from ..permissions import ALL_FIELDS, PermissionMatrix
+from ..registry import reset_global_registry
+from ..transaction import unit_of_work
+from ..types import InputObjectType, Mutation, Node, ObjectType
+from .models import Base
+from .models import Department as DepartmentModel
+from .models import Employee as EmployeeModel
+from .models import Tag as TagModel
+
+
+@pytest.fixture(scope="function")
+def session():
+    reset_global_registry()
+    connection = create_engine("sqlite://").connect()
+    Base.metadata.create_all(connection)
+    session = sessionmaker(bind=connection)()
+    department = DepartmentModel(id=1, name="Sales")
+    session.add(department)
+    session.add(EmployeeModel(id=1, name="ABA", department=department))
+    session.commit()
+
+    yield session
+
+    session.close()
+    connection.close()
+
+
+@pytest.fixture(scope="function")
+def savepoint_session():
+    reset_global_registry()
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+
+    # pysqlite commits on SAVEPOINT unless SQLAlchemy emits the BEGIN
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(EmployeeModel(id=1, name="ABA"))
+    session.commit()
+
+    yield session
+
+    session.close()
+
+
+def create_employee_type():
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+            filter_fields = "department_id"
+
+    class Employee(ObjectType):
+        class Meta:
+            model = EmployeeModel
+            interfaces = (EmployeeNode,)
+
+    class DepartmentNode(Node):
+        class Meta:
+            model = DepartmentModel
+
+    class Department(ObjectType):
+        class Meta:
+            model = DepartmentModel
+            interfaces = (DepartmentNode,)
+
+    return Employee
+
+
+def create_mutation(output, session, **meta):
+    class EmployeeInput(InputObjectType):
+        class Meta:
+            schema = output
+
+    meta.setdefault("roles_map", {"admin": "*"})
+    meta.setdefault("user_roles", ["admin"])
+    return type("UpsertEmployee", (Mutation,), {
+        "Arguments": type("Arguments", (), {
+            "input": EmployeeInput(required=True)}),
+        "Meta": type("Meta", (), dict(
+            output=output, session=lambda info: session, **meta)),
+    })
+
+
+def create_schema(output, **mutations):
+    class Query(graphene.ObjectType):
+        employee = graphene.Field(output)
+
+    mutation = type("Mutations", (graphene.ObjectType,), mutations)
+    return graphene.Schema(query=Query, mutation=mutation)
+
+
+def test_callable_roles_map_with_frozen_options(session):
+    Employee = create_employee_type()
+    calls = []
+
+    def roles_map(info):
+        calls.append(info)
+        return {"admin": "*", "user": ["name"]}
+
+    UpsertEmployee = create_mutation(
+        Employee, session, roles_map=roles_map, user_roles=["user"])
+    # The options are only frozen outside of pytest
+    BaseOptions.freeze(UpsertEmployee._meta)
+    schema = create_schema(Employee, upsert_employee=UpsertEmployee.Field())
+
+    query = """
+        mutation ($id: ID!, $name: String) {
+          upsertEmployee(input: {id: $id, name: $name}) {
+            name
+          }
+        }
+    """
+    for name in ("ABO", "ABE"):
+        result = schema.execute(query, variable_values={
+            "id": Node.to_global_id("Employee", 1), "name": name})
+        assert not result.errors
+        assert result.data == {"upsertEmployee": {"name": name}}
+    assert len(calls) == 2
+    assert session.query(EmployeeModel).get(1).name == "ABE"
+
+
+def test_permission_matrix():
+    permissions = PermissionMatrix({
+        "admin": "*", "editor": ["name"], "viewer": None})
+    assert permissions.fields_for_roles(["admin", "editor"]) == (
+        ALL_FIELDS, True)
+    assert permissions.fields_for_roles(["editor", "viewer"]) == (
+        frozenset({"id", "name"}), True)
+    assert permissions.filter(["editor"], {"id": 1, "name": "ABO"}) == {
+        "id": 1, "name": "ABO"}
+    # Unset fields are skipped, values for other fields are rejected
+    assert permissions.filter(["editor"], {"name": "ABO", "tags": None}) == {
+        "name": "ABO"}
+    with pytest.raises(Exception, match="Field tags not allowed for user"):
+        permissions.filter(["editor"], {"name": "ABO", "tags": [1]})
+    with pytest.raises(Exception, match="No roles for user"):
+        permissions.fields_for_roles(["guest"])
+
+
+def test_relationship_of_mutation_payload(session):
+    Employee = create_employee_type()
+    UpsertEmployee = create_mutation(Employee, session)
+    schema = create_schema(Employee, upsert_employee=UpsertEmployee.Field())
+
+    result = schema.execute("""
+        mutation ($id: ID!) {
+          upsertEmployee(input: {id: $id, name: "ABO"}) {
+            name
+            department {
+              name
+            }
+          }
+        }
+    """, variable_values={"id": Node.to_global_id("Employee", 1)})
+    assert not result.errors
+    assert result.data == {
+        "upsertEmployee": {"name": "ABO", "department": None}}
+
+
+def test_update_where_input(session):
+    Employee = create_employee_type()
+    UpsertEmployee = create_mutation(Employee, session)
+    schema = create_schema(
+        Employee, update_where=UpsertEmployee.UpdateWhereField())
+
+    input_fields = UpsertEmployee._get_input_type()._meta.fields
+    assert {"id", "tags"} <= set(input_fields)
+    patch_fields = UpsertEmployee._get_partial_input_type()._meta.fields
+    assert set(patch_fields) == {"name", "department"}
+
+    result = schema.execute("""
+        mutation {
+          updateEmployeeWhere(departmentId: 1, input: {name: "ABO"})
+        }
+    """)
+    assert not result.errors
+    assert result.data == {"updateEmployeeWhere": 1}
+    assert session.query(EmployeeModel).get(1).name == "ABO"
+
+
+def track(session):
+    statements = []
+    event.listen(session.bind, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_bulk_upsert(session):
+    Employee = create_employee_type()
+    UpsertEmployee = create_mutation(Employee, session)
+    schema = create_schema(
+        Employee, upsert_employees=UpsertEmployee.Field(bulk=True))
+    statements = track(session)
+
+    result = schema.execute("""
+        mutation ($id: ID!, $newId: ID!, $noId: ID!) {
+          upsertEmployees(input: [
+            {id: $noId, name: "ABO"},
+            {id: $id, name: "ABE"},
+            {id: $newId, name: "ABU"},
+            {id: $noId, name: "ABY", department: 1},
+          ]) {
+            id
+            name
+          }
+        }
+    """, variable_values={"id": Node.to_global_id("Employee", 1),
+                          "newId": Node.to_global_id("Employee", 10),
+                          "noId": Node.to_global_id("Employee", "")})
+    assert not result.errors
+    assert [Node.from_global_id(e["id"])[1] for e in
+            result.data["upsertEmployees"]] == ["11", "1", "10", "12"]
+    assert [e["name"] for e in result.data["upsertEmployees"]] == [
+        "ABO", "ABE", "ABU", "ABY"]
+    assert {e.id: (e.name, e.department_id) for e in
+            session.query(EmployeeModel)} == {
+        1: ("ABE", 1), 10: ("ABU", None),
+        11: ("ABO", None), 12: ("ABY", 1)}
+    inserts = [s for s in statements if s.startswith("INSERT")]
+    # SQLite doesn't support RETURNING on SQLAlchemy 1.4, the rows without
+    # a key are inserted one by one
+    assert len(inserts) == 3
+
+
+UPSERT_QUERY = """
+    mutation ($id: ID!, $name: String) {
+      upsertEmployee(input: {id: $id, name: $name}) {
+        id
+        name
+      }
+    }
+"""
+
+
+def test_native_upsert(session):
+    Employee = create_employee_type()
+    UpsertEmployee = create_mutation(
+        Employee, session, upsert_strategy="native")
+    schema = create_schema(Employee, upsert_employee=UpsertEmployee.Field())
+    statements = track(session)
+
+    for id, name in ((1, "ABO"), (2, "ABU")):
+        result = schema.execute(UPSERT_QUERY, variable_values={
+            "id": Node.to_global_id("Employee", id), "name": name})
+        assert not result.errors
+        assert result.data == {"upsertEmployee": {
+            "id": Node.to_global_id("Employee", id), "name": name}}
+    assert {e.id: e.name for e in session.query(EmployeeModel)} == {
+        1: "ABO", 2: "ABU"}
+    writes = [s for s in statements if not s.startswith("SELECT")]
+    assert len(writes) == 2
+    assert all("ON CONFLICT (id) DO UPDATE" in s for s in writes)
+
+
+def test_upsert_output_without_reload(session):
+    Employee = create_employee_type()
+    UpsertEmployee = create_mutation(Employee, session)
+    schema = create_schema(Employee, upsert_employee=UpsertEmployee.Field())
+    statements = track(session)
+
+    result = schema.execute(UPSERT_QUERY, variable_values={
+        "id": Node.to_global_id("Employee", 1), "name": "ABO"})
+    assert not result.errors
+    assert result.data == {"upsertEmployee": {
+        "id": Node.to_global_id("Employee", 1), "name": "ABO"}}
+    # The row is loaded to be updated, the output isn't loaded again
+    assert [s.split()[0] for s in statements] == ["SELECT", "UPDATE"]
+
+
+def test_embedded_inputs_load_in_one_query(session):
+    session.add_all([TagModel(id=i, name=n) for i, n in ((1, "a"), (2, "b"))])
+    session.commit()
+    Employee = create_employee_type()
+    UpsertEmployee = create_mutation(Employee, session)
+    schema = create_schema(Employee, upsert_employee=UpsertEmployee.Field())
+    statements = track(session)
+
+    result = schema.execute("""
+        mutation ($id: ID!, $tags: [TagRelationshipInput]) {
+          upsertEmployee(input: {id: $id, tags: $tags}) {
+            name
+          }
+        }
+    """, variable_values={"id": Node.to_global_id("Employee", 1), "tags": [
+        {"id": Node.to_global_id("Tag", 1)},
+        {"id": Node.to_global_id("Tag", 2)},
+    ]})
+    assert not result.errors
+    # One IN query for every embedded row of the model
+    assert len([s for s in statements
+                if s.startswith("SELECT tags.id") and "IN (" in s]) == 1
+    assert sorted((t.id, t.name) for t in
+                  session.query(EmployeeModel).get(1).tags) == [
+        (1, "a"), (2, "b")]
+
+
+def test_sql_relationship_sync(session):
+    tags = [TagModel(id=i, name=n) for i, n in ((1, "a"), (2, "b"), (3, "c"))]
+    session.add_all(tags)
+    session.query(EmployeeModel).get(1).tags = tags[:2]
+    session.commit()
+    Employee = create_employee_type()
+    UpsertEmployee = create_mutation(
+        Employee, session, relationship_sync="sql")
+    schema = create_schema(Employee, upsert_employee=UpsertEmployee.Field())
+    statements = track(session)
+
+    result = schema.execute("""
+        mutation ($id: ID!, $tags: [TagRelationshipInput]) {
+          upsertEmployee(input: {id: $id, tags: $tags}) {
+            name
+          }
+        }
+    """, variable_values={"id": Node.to_global_id("Employee", 1), "tags": [
+        {"id": Node.to_global_id("Tag", 2)},
+        {"id": Node.to_global_id("Tag", 3)},
+    ]})
+    assert not result.errors
+    # The current collection isn't loaded
+    assert not [s for s in statements if "FROM tags, employee_tags" in s]
+    assert len([s for s in statements
+                if s.startswith(("DELETE FROM employee_tags",
+                                 "INSERT INTO employee_tags"))]) == 2
+    session.expire_all()
+    assert sorted(t.id for t in session.query(EmployeeModel).get(1).tags) \
+        == [2, 3]
+
+
+def test_failing_input_keeps_the_fields_of_the_operation(
+        savepoint_session):
+    session = savepoint_session
+    Employee = create_employee_type()
+    UpsertEmployee = create_mutation(
+        Employee, session, commit_mode="operation")
+    schema = create_schema(Employee, upsert_employee=UpsertEmployee.Field())
+    # Loading the embedded tags fails
+    TagModel.__table__.drop(session.bind)
+
+    context = {}
+    with unit_of_work(context):
+        result = schema.execute("""
+            mutation ($id: ID!, $tagId: ID!) {
+              first: upsertEmployee(input: {id: $id, name: "ABO"}) {
+                name
+              }
+              second: upsertEmployee(input: {id: $id, tags: [{id: $tagId}]}) {
+                name
+              }
+            }
+        """, variable_values={"id": Node.to_global_id("Employee", 1),
+                              "tagId": Node.to_global_id("Tag", 1)},
+            context_value=context)
+    assert result.data == {"first": {"name": "ABO"}, "second": None}
+    assert len(result.errors) == 1
+    session.expire_all()
+    assert session.query(EmployeeModel).get(1).name == "ABO"
+
+
+def test_sql_idempotency_store_creates_its_table():
+    store = SQLIdempotencyStore(create_engine(
+        "sqlite://", poolclass=StaticPool,
+        connect_args={"check_same_thread": False}))
+    calls = []
+
+    def mutate():
+        calls.append(None)
+        return {"name": "ABA"}
+
+    assert store.run("key", mutate) == {"name": "ABA"}
+    assert store.run("key", mutate) == {"name": "ABA"}
+    assert len(calls) == 1
+
+
+def create_store(**options):
+    return SQLIdempotencyStore(create_engine(
+        "sqlite://", poolclass=StaticPool,
+        connect_args={"check_same_thread": False}), **options)
+
+
+def test_sql_idempotency_store_takes_over_expired_claims():
+    store = create_store(lease_timeout=60, timeout=0.2)
+    store.create_table()
+    with store.bind.begin() as connection:
+        connection.execute(store.table.insert(), [
+            {"key": "expired", "done": False,
+             "created_at": datetime.utcnow() - timedelta(seconds=61)},
+            {"key": "running", "done": False,
+             "created_at": datetime.utcnow()},
+        ])
+
+    assert store.run("expired", lambda: {"name": "ABA"}) == {"name": "ABA"}
+    assert store.get("expired") == {"name": "ABA"}
+    with pytest.raises(Exception, match="is still running"):
+        store.run("running", lambda: {"name": "ABO"})
+    assert store.get("running") is MISSING
+
+
+def test_sql_idempotency_store_releases_failed_claims():
+    store = create_store()
+
+    def fail():
+        raise Exception("Failed")
+
+    with pytest.raises(Exception, match="Failed"):
+        store.run("key", fail)
+    assert store.run("key", lambda: {"name": "ABA"}) == {"name": "ABA"}
+
+
+def test_idempotency_store_is_abstract():
+    with pytest.raises(TypeError):
+        IdempotencyStore()
+
+
+def test_idempotent_result_stored_after_the_operation_commits(
+        savepoint_session):
+    session = savepoint_session
+    Employee = create_employee_type()
+    store = MemoryIdempotencyStore()
+    UpsertEmployee = create_mutation(
+        Employee, session, commit_mode="operation", idempotency_store=store)
+    schema = create_schema(Employee, upsert_employee=UpsertEmployee.Field())
+    query = """
+        mutation ($id: ID!, $name: String, $key: String) {
+          upsertEmployee(input: {id: $id, name: $name},
+                         idempotencyKey: $key) {
+            name
+          }
+        }
+    """
+    variables = {"id": Node.to_global_id("Employee", 1), "name": "ABO",
+                 "key": "key"}
+
+    context = {}
+    with pytest.raises(Exception, match="Failed"):
+        with unit_of_work(context):
+            result = schema.execute(
+                query, variable_values=variables, context_value=context)
+            assert not result.errors
+            assert store.get("UpsertEmployee:key") is MISSING
+            raise Exception("Failed")
+    assert store.get("UpsertEmployee:key") is MISSING
+    assert session.query(EmployeeModel).get(1).name == "ABA"
+
+    context = {}
+    with unit_of_work(context):
+        result = schema.execute(
+            query, variable_values=variables, context_value=context)
+        assert not result.errors
+    assert store.get("UpsertEmployee:key") == {"name": "ABO"}
+    assert session.query(EmployeeModel).get(1).name == "ABO"
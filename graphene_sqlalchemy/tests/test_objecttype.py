@@ -0,0 +1,223 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import graphene
+
+from ..fields import ConnectionField
+from ..registry import reset_global_registry
+from ..types import Node, ObjectType
+from .models import Article as ArticleModel
+from .models import Base
+from .models import Reporter as ReporterModel
+
+
+@pytest.fixture(scope="function")
+def session():
+    reset_global_registry()
+    connection = create_engine("sqlite://").connect()
+    Base.metadata.create_all(connection)
+    session = sessionmaker(bind=connection)()
+    session.add_all([
+        ReporterModel(id=1, first_name="ABA", last_name="X"),
+        ReporterModel(id=2, first_name="ABO", last_name="Y"),
+    ])
+    session.commit()
+
+    yield session
+
+    session.close()
+    connection.close()
+
+
+def create_scoped_schema(filter_fields=None):
+    class ReporterNode(Node):
+        class Meta:
+            model = ReporterModel
+
+        if filter_fields:
+            Meta.filter_fields = filter_fields
+
+    class Reporter(ObjectType):
+        class Meta:
+            model = ReporterModel
+            interfaces = (ReporterNode,)
+
+        @classmethod
+        def get_query(cls, info):
+            # e.g. a tenant filter
+            return super().get_query(info).filter(
+                ReporterModel.last_name == "X")
+
+    class Query(graphene.ObjectType):
+        reporter = ReporterNode.Field(Reporter)
+
+    return graphene.Schema(query=Query, types=[Reporter])
+
+
+def test_filter_node_keeps_criteria_of_get_query(session):
+    schema = create_scoped_schema(filter_fields="first_name")
+    query = """
+        query ($name: String) {
+          reporter(firstName: $name) {
+            first_name
+          }
+        }
+    """
+    result = schema.execute(query, variable_values={"name": "ABA"},
+                            context_value={"session": session})
+    assert not result.errors
+    assert result.data == {"reporter": {"first_name": "ABA"}}
+
+    result = schema.execute(query, variable_values={"name": "ABO"},
+                            context_value={"session": session})
+    assert not result.errors
+    assert result.data == {"reporter": None}
+
+
+def test_get_node_keeps_criteria_of_get_query(session):
+    schema = create_scoped_schema()
+    query = """
+        query ($id: ID!) {
+          reporter(id: $id) {
+            first_name
+          }
+        }
+    """
+    result = schema.execute(
+        query, variable_values={"id": Node.to_global_id("Reporter", 1)},
+        context_value={"session": session})
+    assert not result.errors
+    assert result.data == {"reporter": {"first_name": "ABA"}}
+
+    result = schema.execute(
+        query, variable_values={"id": Node.to_global_id("Reporter", 2)},
+        context_value={"session": session})
+    assert not result.errors
+    assert result.data == {"reporter": None}
+
+
+def test_filter_node_statements(session):
+    class ReporterNode(Node):
+        class Meta:
+            model = ReporterModel
+            filter_fields = "first_name"
+
+    class Reporter(ObjectType):
+        class Meta:
+            model = ReporterModel
+            interfaces = (ReporterNode,)
+
+    class Reporters(ObjectType):
+        class Meta:
+            model = ReporterModel
+            interfaces = (ReporterNode,)
+            return_many = True
+            skip_registry = True
+
+    class Query(graphene.ObjectType):
+        reporter = ReporterNode.Field(Reporter)
+        reporters = ReporterNode.Field(Reporters)
+
+    schema = graphene.Schema(query=Query, types=[Reporter])
+    statements = []
+    event.listen(session.bind, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    session.add(ReporterModel(id=3, first_name="ABA", last_name="Z"))
+    session.commit()
+    del statements[:]
+
+    query = """
+        query ($name: String) {
+          reporter(firstName: $name) {
+            last_name
+          }
+          reporters(firstName: $name) {
+            last_name
+          }
+        }
+    """
+    for _ in range(2):
+        result = schema.execute(query, variable_values={"name": "ABA"},
+                                context_value={"session": session})
+        assert not result.errors
+        assert result.data == {
+            "reporter": {"last_name": "X"},
+            "reporters": [{"last_name": "X"}, {"last_name": "Z"}]}
+    assert len(statements) == 4
+    # A single node is fetched with a statement of its own limited to a row
+    assert statements[0] == statements[2]
+    assert statements[0].endswith("LIMIT ? OFFSET ?")
+    assert statements[1] == statements[3]
+    assert "LIMIT" not in statements[1]
+
+
+def test_indexed_sort_enums_of_different_columns(session):
+    def create_type(model, name, indexed_fields):
+        node = type(f"{name}Node", (Node,), {
+            "Meta": type("Meta", (), {"model": model})})
+        return type(name, (ObjectType,), {"Meta": type("Meta", (), {
+            "model": model,
+            "interfaces": (node,),
+            "indexed_fields": indexed_fields,
+            "skip_registry": True,
+        })})
+
+    def get_sort_argument(object_type):
+        return ConnectionField(object_type._meta.connection).args["sort"]
+
+    first_enum = get_sort_argument(
+        create_type(ArticleModel, "Article", "headline")).type.of_type
+    second_enum = get_sort_argument(
+        create_type(ArticleModel, "OtherArticle", "pub_date")).type.of_type
+    assert first_enum._meta.name != second_enum._meta.name
+    assert set(first_enum._meta.enum.__members__) == {
+        "id_asc", "id_desc", "headline_asc", "headline_desc"}
+    assert set(second_enum._meta.enum.__members__) == {
+        "id_asc", "id_desc", "pub_date_asc", "pub_date_desc"}
+
+    # The primary key isn't in indexed_fields but stays the default sort
+    sort = get_sort_argument(
+        create_type(ReporterModel, "Reporter", "first_name"))
+    assert sort.default_value == ["id_asc"]
+
+
+def test_index_aware_node_filters():
+    reset_global_registry()
+
+    class ReporterNode(Node):
+        class Meta:
+            model = ReporterModel
+            filter_fields = "first_name,last_name"
+            indexed_fields = "first_name"
+
+    class Reporter(ObjectType):
+        class Meta:
+            model = ReporterModel
+            interfaces = (ReporterNode,)
+
+    class Query(graphene.ObjectType):
+        reporter = ReporterNode.Field(Reporter)
+
+    schema = graphene.Schema(query=Query, types=[Reporter])
+    assert set(schema.get_query_type().fields["reporter"].args) == {
+        "firstName"}
+
+
+def test_index_aware_sort_enum_discovers_indexes():
+    reset_global_registry()
+
+    class ReporterNode(Node):
+        class Meta:
+            model = ReporterModel
+
+    class Reporter(ObjectType):
+        class Meta:
+            model = ReporterModel
+            interfaces = (ReporterNode,)
+            index_aware = True
+
+    sort = ConnectionField(Reporter._meta.connection).args["sort"]
+    # Only the primary key of reporters is indexed
+    assert set(sort.type.of_type._meta.enum.__members__) == {
+        "id_asc", "id_desc"}
@@ -0,0 +1,121 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import graphene
+
+from ..fields import ConnectionField
+from ..records import Record
+from ..registry import reset_global_registry
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Department as DepartmentModel
+from .models import Employee as EmployeeModel
+
+
+@pytest.fixture(scope="function")
+def session():
+    reset_global_registry()
+    connection = create_engine("sqlite://").connect()
+    Base.metadata.create_all(connection)
+    session = sessionmaker(bind=connection)()
+    session.add_all([
+        DepartmentModel(id=1, name="Sales"),
+        DepartmentModel(id=2, name="IT"),
+        EmployeeModel(id=1, name="ABA", department_id=1),
+        EmployeeModel(id=2, name="ABO", department_id=2),
+        EmployeeModel(id=3, name="ABU", department_id=1),
+    ])
+    session.commit()
+
+    yield session
+
+    session.close()
+    connection.close()
+
+
+@pytest.fixture(scope="function")
+def schema():
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+
+    class Employee(ObjectType):
+        class Meta:
+            model = EmployeeModel
+            interfaces = (EmployeeNode,)
+            aggregates = True
+
+        def resolve_name(root, info):
+            assert isinstance(root, Record)
+            return root.name
+
+    class DepartmentNode(Node):
+        class Meta:
+            model = DepartmentModel
+
+    class Department(ObjectType):
+        class Meta:
+            model = DepartmentModel
+            interfaces = (DepartmentNode,)
+
+    class Query(graphene.ObjectType):
+        employees = ConnectionField(
+            Employee._meta.connection, read_only=True)
+
+    return graphene.Schema(query=Query, types=[Employee, Department])
+
+
+def test_read_only_connection(session, schema):
+    statements = []
+    event.listen(session.bind, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+    result = schema.execute("""
+        {
+          employees(first: 2) {
+            edges {
+              node {
+                name
+                department {
+                  name
+                }
+              }
+            }
+          }
+        }
+    """, context_value={"session": session})
+    assert not result.errors
+    assert [e["node"] for e in result.data["employees"]["edges"]] == [
+        {"name": "ABA", "department": {"name": "Sales"}},
+        {"name": "ABO", "department": {"name": "IT"}},
+    ]
+    # The count, the selected columns of the page and one batch of
+    # departments
+    assert len(statements) == 3
+    assert statements[1].startswith(
+        "SELECT employees.id AS employees_id, employees.name AS "
+        "employees_name, employees.department_id AS "
+        "employees_department_id \nFROM employees")
+
+
+def test_read_only_connection_aggregates(session, schema):
+    result = schema.execute("""
+        {
+          employees(first: 1) {
+            edges {
+              node {
+                name
+              }
+            }
+            aggregate {
+              count
+              max { department_id }
+            }
+          }
+        }
+    """, context_value={"session": session})
+    assert not result.errors
+    assert result.data["employees"] == {
+        "edges": [{"node": {"name": "ABA"}}],
+        "aggregate": {"count": 3, "max": {"department_id": 2}},
+    }
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import graphene
+
+from ..fields import ConnectionField
+from ..registry import reset_global_registry
+from ..search import create_sqlite_fts_table
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Employee as EmployeeModel
+
+
+@pytest.fixture(scope="function")
+def session():
+    reset_global_registry()
+    connection = create_engine("sqlite://").connect()
+    Base.metadata.create_all(connection)
+    create_sqlite_fts_table(EmployeeModel, "name", connection)
+    session = sessionmaker(bind=connection)()
+    session.add_all([
+        EmployeeModel(id=1, name="java developer"),
+        EmployeeModel(id=2, name="python developer and java trainer"),
+        EmployeeModel(id=3, name="python python python"),
+        EmployeeModel(id=4, name="manager"),
+    ])
+    session.commit()
+
+    yield session
+
+    session.close()
+    connection.close()
+
+
+@pytest.fixture(scope="function")
+def schema(session):
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+            search_fields = "name"
+
+    class Employee(ObjectType):
+        class Meta:
+            model = EmployeeModel
+            interfaces = (EmployeeNode,)
+            search_fields = "name"
+
+    class Query(graphene.ObjectType):
+        employee = EmployeeNode.Field(Employee)
+        employees = ConnectionField(Employee._meta.connection)
+
+    return graphene.Schema(query=Query, types=[Employee])
+
+
+def get_ids(result):
+    assert not result.errors
+    return [int(Node.from_global_id(e["node"]["id"])[1])
+            for e in result.data["employees"]["edges"]]
+
+
+def test_search_connection(session, schema):
+    query = """
+        query ($search: String) {
+          employees(search: $search, sort: [relevance_desc, id_asc]) {
+            edges {
+              node {
+                id
+              }
+            }
+          }
+        }
+    """
+    result = schema.execute(query, variable_values={"search": "python"},
+                            context_value={"session": session})
+    assert get_ids(result) == [3, 2]
+
+    result = schema.execute(query, variable_values={"search": "java"},
+                            context_value={"session": session})
+    assert get_ids(result) == [1, 2]
+
+    # Words are matched literally, not as FTS5 query syntax
+    result = schema.execute(query, variable_values={"search": "java OR"},
+                            context_value={"session": session})
+    assert get_ids(result) == []
+
+
+def test_search_connection_without_value_ignores_relevance(session, schema):
+    result = schema.execute("""
+        {
+          employees(sort: [relevance_desc, id_desc]) {
+            edges {
+              node {
+                id
+              }
+            }
+          }
+        }
+    """, context_value={"session": session})
+    assert get_ids(result) == [4, 3, 2, 1]
+
+
+def test_search_node(session, schema):
+    result = schema.execute("""
+        {
+          employee(search: "manager") {
+            name
+          }
+        }
+    """, context_value={"session": session})
+    assert not result.errors
+    assert result.data == {"employee": {"name": "manager"}}
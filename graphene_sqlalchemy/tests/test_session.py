@@ -0,0 +1,122 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+import graphene
+
+from ..fields import ConnectionField
+from ..registry import reset_global_registry
+from ..routing import ReplicaRouter, RoutingSession
+from ..session import request_session
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Employee as EmployeeModel
+
+
+def create_database(path, *names):
+    engine = create_engine(f"sqlite:///{path}", poolclass=QueuePool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([EmployeeModel(id=i, name=n)
+                     for i, n in enumerate(names, 1)])
+    session.commit()
+    session.close()
+    return engine
+
+
+@pytest.fixture(scope="function")
+def schema():
+    reset_global_registry()
+
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+
+    class Employee(ObjectType):
+        class Meta:
+            model = EmployeeModel
+            interfaces = (EmployeeNode,)
+
+    class Query(graphene.ObjectType):
+        employees = ConnectionField(Employee._meta.connection)
+        other_employees = ConnectionField(Employee._meta.connection)
+
+    return graphene.Schema(query=Query, types=[Employee])
+
+
+QUERY = """
+    {
+      employees {
+        edges {
+          node {
+            name
+          }
+        }
+      }
+      other_employees: otherEmployees {
+        edges {
+          node {
+            name
+          }
+        }
+      }
+    }
+"""
+
+
+def get_names(result, field="employees"):
+    assert not result.errors
+    return [e["node"]["name"] for e in result.data[field]["edges"]]
+
+
+def test_request_session_uses_one_connection(tmp_path, schema):
+    engine = create_database(tmp_path / "db.sqlite", "ABA", "ABO")
+    checkouts = []
+    event.listen(engine, "checkout", lambda *args: checkouts.append(args))
+
+    context = {}
+    with request_session(context, sessionmaker(bind=engine)) as manager:
+        result = schema.execute(QUERY, context_value=context)
+        assert get_names(result) == ["ABA", "ABO"]
+        assert get_names(result, "other_employees") == ["ABA", "ABO"]
+        assert manager.session is not None
+        assert engine.pool.checkedout() == 1
+    assert len(checkouts) == 1
+    assert engine.pool.checkedout() == 0
+    assert manager.session is None
+
+
+def test_routing_session(tmp_path, schema):
+    primary = create_database(tmp_path / "primary.sqlite", "ABA", "ABO")
+    replica = create_database(tmp_path / "replica.sqlite", "ABA")
+    Session = sessionmaker(class_=RoutingSession,
+                           router=ReplicaRouter(primary, [replica]))
+
+    context = {}
+    with request_session(context, Session) as manager:
+        result = schema.execute(QUERY, context_value=context)
+        assert get_names(result) == ["ABA"]
+        session = manager.get_session()
+        session.add(EmployeeModel(id=3, name="ABU"))
+        session.commit()
+        # Reads after a write see it on the primary
+        result = schema.execute(QUERY, context_value=context)
+        assert get_names(result) == ["ABA", "ABO", "ABU"]
+    assert replica.pool.checkedout() == 0
+    assert primary.pool.checkedout() == 0
+
+
+def test_replica_router_strategies(tmp_path):
+    primary, first, second = (create_database(tmp_path / f"{n}.sqlite")
+                              for n in ("primary", "first", "second"))
+    router = ReplicaRouter(primary, [first, second])
+    assert [router.get_replica() for _ in range(3)] == [
+        first, second, first]
+    assert ReplicaRouter(primary).get_replica() is primary
+
+    router = ReplicaRouter(primary, [first, second], strategy="least_busy")
+    connection = first.connect()
+    assert [router.get_replica() for _ in range(2)] == [second, second]
+    connection.close()
+    assert [router.get_replica() for _ in range(2)] == [first, second]
@@ -0,0 +1,111 @@
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import graphene
+
+from ..fields import ConnectionField
+from ..registry import get_global_registry, reset_global_registry
+from ..sharding import _shard_query, merge_shards, sort_columns
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Employee as EmployeeModel
+
+
+def create_shard(*employees):
+    # The shards are queried from worker threads
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool,
+        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(employees)
+    session.commit()
+    return session
+
+
+def test_shard_queries_order_nulls_like_the_merge():
+    sessions = [
+        create_shard(EmployeeModel(id=1, name="b"), EmployeeModel(id=3)),
+        create_shard(EmployeeModel(id=2), EmployeeModel(id=4, name="a")),
+    ]
+    columns, descending = sort_columns(
+        EmployeeModel, [EmployeeModel.name.asc()])
+    items, _ = merge_shards(
+        [s.query(EmployeeModel) for s in sessions], columns, descending)
+    assert [e.id for e in items] == [2, 3, 4, 1]
+
+    columns, descending = sort_columns(
+        EmployeeModel, [EmployeeModel.name.desc()])
+    items, _ = merge_shards(
+        [s.query(EmployeeModel) for s in sessions], columns, descending)
+    assert [e.id for e in items] == [1, 4, 2, 3]
+
+
+def test_shard_query_sql_orders_nulls():
+    session = sessionmaker(bind=create_engine("sqlite://"))()
+    columns, descending = sort_columns(
+        EmployeeModel, [EmployeeModel.name.desc()])
+    statement = _shard_query(
+        session.query(EmployeeModel), columns, descending).statement
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert sql.endswith(
+        "ORDER BY employees.name DESC NULLS LAST, "
+        "employees.id ASC NULLS FIRST")
+
+
+def test_sharded_connection_aggregates_every_shard():
+    reset_global_registry()
+    sessions = [
+        create_shard(EmployeeModel(id=1, name="a", department_id=1),
+                     EmployeeModel(id=3, name="c")),
+        create_shard(EmployeeModel(id=2, name="b", department_id=2),
+                     EmployeeModel(id=4, name="d", department_id=2)),
+    ]
+    get_global_registry().register_shards(
+        EmployeeModel, {i: s.bind for i, s in enumerate(sessions)})
+
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+
+    class Employee(ObjectType):
+        class Meta:
+            model = EmployeeModel
+            interfaces = (EmployeeNode,)
+            aggregates = True
+
+    class Query(graphene.ObjectType):
+        employees = ConnectionField(Employee._meta.connection)
+
+    schema = graphene.Schema(query=Query, types=[Employee])
+    result = schema.execute("""
+        {
+          employees(first: 1) {
+            edges {
+              node {
+                name
+              }
+            }
+            aggregate {
+              count
+              sum { department_id }
+              avg { department_id }
+              min { department_id }
+              max { department_id }
+            }
+          }
+        }
+    """, context_value={})
+    assert not result.errors
+    assert result.data["employees"] == {
+        "edges": [{"node": {"name": "a"}}],
+        "aggregate": {
+            "count": 4,
+            "sum": {"department_id": 5.0},
+            "avg": {"department_id": 5 / 3},
+            "min": {"department_id": 1},
+            "max": {"department_id": 2},
+        },
+    }
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import graphene
+
+from ..fields import ConnectionField
+from ..registry import reset_global_registry
+from ..streaming import execute_incremental, STREAM_DIRECTIVES
+from ..types import Node, ObjectType
+from .models import Base
+from .models import Employee as EmployeeModel
+
+
+@pytest.fixture(scope="function")
+def session():
+    reset_global_registry()
+    connection = create_engine("sqlite://").connect()
+    Base.metadata.create_all(connection)
+    session = sessionmaker(bind=connection)()
+    session.add_all([EmployeeModel(id=i, name=f"e{i}") for i in range(1, 11)])
+    session.commit()
+
+    yield session
+
+    session.close()
+    connection.close()
+
+
+@pytest.fixture(scope="function")
+def schema(session):
+    class EmployeeNode(Node):
+        class Meta:
+            model = EmployeeModel
+
+    class Employee(ObjectType):
+        class Meta:
+            model = EmployeeModel
+            interfaces = (EmployeeNode,)
+
+    class Query(graphene.ObjectType):
+        employees = ConnectionField(Employee._meta.connection)
+
+    return graphene.Schema(query=Query, types=[Employee],
+                           directives=STREAM_DIRECTIVES)
+
+
+QUERY = """
+    {
+      employees {
+        edges @stream(initialCount: 2, batchSize: 3) {
+          node {
+            name
+          }
+        }
+      }
+    }
+"""
+
+
+def get_names(edges):
+    return [edge["node"]["name"] for edge in edges]
+
+
+def test_stream_without_incremental_execution(session, schema):
+    result = schema.execute(QUERY, context_value={"session": session})
+    assert not result.errors
+    assert get_names(result.data["employees"]["edges"]) == [
+        f"e{i}" for i in range(1, 11)]
+
+
+def test_stream_with_incremental_execution(session, schema):
+    payloads = list(execute_incremental(
+        schema, QUERY, context_value={"session": session}))
+    first = payloads[0]
+    assert "errors" not in first
+    assert get_names(first["data"]["employees"]["edges"]) == ["e1", "e2"]
+    assert [p["hasNext"] for p in payloads] == [True, True, True, False]
+
+    names = get_names(first["data"]["employees"]["edges"])
+    for payload in payloads[1:]:
+        incremental, = payload["incremental"]
+        assert incremental["path"] == ["employees", "edges", len(names)]
+        names.extend(get_names(incremental["items"]))
+    assert names == [f"e{i}" for i in range(1, 11)]
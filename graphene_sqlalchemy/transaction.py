@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+
+from .utils import get_context_value, set_context_value
+
+# Key of the unit of work of the current operation in the GraphQL context
+UNIT_OF_WORK_CONTEXT_KEY = '_graphene_sqlalchemy_unit_of_work'
+
+
+class UnitOfWork(object):
+    """Sessions written by mutations in `operation` commit mode, committed
+    together once the operation is resolved"""
+
+    def __init__(self):
+        self.sessions = []
+        self._on_commit = []
+        self._on_rollback = []
+
+    def add(self, session):
+        if not any(s is session for s in self.sessions):
+            self.sessions.append(session)
+
+    def on_commit(self, callback):
+        """Calls `callback` once every session is committed"""
+        self._on_commit.append(callback)
+
+    def on_rollback(self, callback):
+        """Calls `callback` when the operation is rolled back"""
+        self._on_rollback.append(callback)
+
+    def commit(self):
+        try:
+            for session in self.sessions:
+                session.commit()
+        except Exception as e:
+            self.rollback()
+            raise e
+        callbacks, self._on_commit, self._on_rollback = \
+            self._on_commit, [], []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        for session in self.sessions:
+            session.rollback()
+        callbacks, self._on_commit, self._on_rollback = \
+            self._on_rollback, [], []
+        for callback in callbacks:
+            callback()
+
+
+def get_unit_of_work(context):
+    return get_context_value(context, UNIT_OF_WORK_CONTEXT_KEY)
+
+
+@contextmanager
+def unit_of_work(context):
+    """Runs a GraphQL operation with a single commit per session.
+    Every mutation field flushes inside its own SAVEPOINT, so a failing
+    field is rolled back alone and the others are committed on exit::
+
+        with unit_of_work(context):
+            result = schema.execute(query, context_value=context)
+    """
+    work = UnitOfWork()
+    set_context_value(context, UNIT_OF_WORK_CONTEXT_KEY, work)
+    try:
+        yield work
+    except Exception as e:
+        work.rollback()
+        raise e
+    else:
+        work.commit()
+    finally:
+        set_context_value(context, UNIT_OF_WORK_CONTEXT_KEY, None)
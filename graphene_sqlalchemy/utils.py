@@ -1,12 +1,19 @@
 import graphene
+from graphene.utils.str_converters import to_camel_case
+from graphql.language import ast
+from sqlalchemy import and_, func, or_, select, tuple_, UniqueConstraint
 from sqlalchemy.exc import ArgumentError
 from sqlalchemy.inspection import inspect
-from sqlalchemy.orm import class_mapper, object_mapper
+from sqlalchemy.orm import class_mapper, interfaces, object_mapper
 from sqlalchemy.orm.exc import UnmappedClassError, UnmappedInstanceError
 
 
 def get_session(context):
-    return context.get("session")
+    from .session import get_request_session
+    manager = get_request_session(context)
+    if manager is not None:
+        return manager.get_session()
+    return get_context_value(context, "session")
 
 
 def get_query(model, context):
@@ -17,8 +24,11 @@ def get_query(model, context):
             raise Exception(
                 "A query in the model Base or a session in the schema is required for querying.\n"
                 "Read more http://docs.graphene-python.org/projects/sqlalchemy/en/latest/tips/#querying")
+        if hasattr(session, 'sync_session'):
+            # An AsyncSession, the query is only built and its statement
+            # is executed asynchronously
+            session = session.sync_session
         query = session.query(model)
-        session.close()
     return query
 
 
@@ -42,13 +52,89 @@ class EnumValue(str):
 _ENUM_CACHE = {}
 
 
-def _sort_enum_for_model(cls, name=None, symbol_name=_symbol_name):
-    name = name or cls.__name__ + "SortEnum"
+def _related_sort_items(cls):
+    """Sort items over the columns of many-to-one relationships and the
+    size of to-many relationships, compiled into correlated subqueries so
+    they order in SQL without changing the rows of the query"""
+    items = []
+    mapper = inspect(cls)
+    for relationship in mapper.relationships:
+        target = relationship.mapper
+        if target is mapper:
+            # Self referential joins can't be correlated without aliases
+            continue
+        if relationship.direction == interfaces.MANYTOONE:
+            for column in target.columns.values():
+                expression = select([column]) \
+                    .where(relationship.primaryjoin) \
+                    .as_scalar()
+                items.append((f'{relationship.key}_{column.name}',
+                              expression))
+        elif relationship.direction in (interfaces.ONETOMANY,
+                                        interfaces.MANYTOMANY):
+            expression = select([func.count()]) \
+                .where(relationship.primaryjoin) \
+                .as_scalar()
+            items.append((f'{relationship.key}_count', expression))
+    return items
+
+
+def get_indexed_columns(model):
+    """Returns the names of the columns leading an index, the primary key
+    or a unique constraint of the model table, which are the columns the
+    database can sort or look up without scanning the table"""
+    table = inspect(model).local_table
+    names = set()
+    groups = [table.primary_key.columns]
+    groups.extend(index.columns for index in table.indexes)
+    groups.extend(c.columns for c in table.constraints
+                  if isinstance(c, UniqueConstraint))
+    for columns in groups:
+        column = next(iter(columns), None)
+        if column is not None:
+            names.add(column.name)
+    return names
+
+
+def get_indexed_fields(model, indexed_fields=None):
+    """Returns the set of columns exposed for sorting and filtering when
+    index awareness is enabled, `indexed_fields` overrides the discovery"""
+    if indexed_fields:
+        if isinstance(indexed_fields, str):
+            indexed_fields = indexed_fields.split(',')
+        return frozenset(indexed_fields)
+    return frozenset(get_indexed_columns(model))
+
+
+def _indexed_enum_name(cls, only_columns):
+    # The enums of other columns than the discovered indexes are named
+    # after their columns
+    if only_columns is None:
+        return ""
+    primary_key = {c.name for c in inspect(cls).primary_key}
+    columns = set(only_columns) | primary_key
+    if columns == get_indexed_columns(cls) | primary_key:
+        return "Indexed"
+    return "Indexed" + "".join(
+        to_camel_case(c)[:1].upper() + to_camel_case(c)[1:]
+        for c in sorted(columns))
+
+
+def _sort_enum_for_model(cls, name=None, symbol_name=_symbol_name,
+                         relevance=False, related=False, only_columns=None):
+    if not name:
+        name = cls.__name__ + ("Search" if relevance else "") + \
+            ("Related" if related else "") + \
+            _indexed_enum_name(cls, only_columns) + "SortEnum"
     if name in _ENUM_CACHE:
         return _ENUM_CACHE[name]
     items = []
     default = []
     for column in inspect(cls).columns.values():
+        # The primary key stays sortable as the default sort
+        if only_columns is not None and column.name not in only_columns \
+                and not column.primary_key:
+            continue
         asc_name = symbol_name(column.name, True)
         asc_value = EnumValue(asc_name, column.asc())
         desc_name = symbol_name(column.name, False)
@@ -56,23 +142,64 @@ def _sort_enum_for_model(cls, name=None, symbol_name=_symbol_name):
         if column.primary_key:
             default.append(asc_value)
         items.extend(((asc_name, asc_value), (desc_name, desc_value)))
+    if related:
+        names = {n for n, _ in items}
+        for key, expression in _related_sort_items(cls):
+            asc_name = symbol_name(key, True)
+            desc_name = symbol_name(key, False)
+            if asc_name in names or desc_name in names:
+                # e.g. `department_id` of the relationship is already
+                # sortable through the foreign key column
+                continue
+            items.extend((
+                (asc_name, EnumValue(asc_name, expression.asc())),
+                (desc_name, EnumValue(desc_name, expression.desc()))))
+    if relevance:
+        from .search import RELEVANCE
+        items.append((str(RELEVANCE), RELEVANCE))
     enum = graphene.Enum(name, items)
     _ENUM_CACHE[name] = (enum, default)
     return enum, default
 
 
-def sort_argument_for_model(cls, has_default=True):
+def sort_argument_for_model(cls, has_default=True, relevance=False,
+                            related=False, only_columns=None):
     """Returns a Graphene argument for the sort field that accepts a list of
     sorting directions for a model.
     If `has_default` is True (the default) it will sort the result by
     the primary key(s)
+    If `relevance` is True the enum also accepts `relevance_desc`, which
+    orders by the rank of the full-text search
+    If `related` is True the enum also accepts the columns of many-to-one
+    relationships and the size of to-many relationships
+    If `only_columns` is given only those columns are sortable
     """
-    enum, default = _sort_enum_for_model(cls)
+    enum, default = _sort_enum_for_model(
+        cls, relevance=relevance, related=related, only_columns=only_columns)
     if not has_default:
         default = None
     return graphene.Argument(graphene.List(enum), default_value=default)
 
 
+def _group_by_enum_for_model(cls, name=None):
+    name = name or cls.__name__ + "GroupByEnum"
+    if name in _ENUM_CACHE:
+        return _ENUM_CACHE[name]
+    items = [(column.name, EnumValue(column.name, column))
+             for column in inspect(cls).columns.values()]
+    enum = graphene.Enum(name, items)
+    _ENUM_CACHE[name] = enum
+    return enum
+
+
+def group_by_argument_for_model(cls):
+    """Returns a required Graphene argument accepting the list of columns
+    a model can be grouped by"""
+    enum = _group_by_enum_for_model(cls)
+    return graphene.Argument(
+        graphene.List(graphene.NonNull(enum)), required=True)
+
+
 def get_column_doc(column):
     return getattr(column, "doc", None)
 
@@ -146,3 +273,77 @@ def get_model_primary_key(cls):
         f = _from_traverse(cls)
     assert f is not None
     return f
+
+
+def supports_tuple_in(dialect):
+    """Whether `(a, b) IN ((...), (...))` runs on `dialect`, SQLAlchemy
+    renders it for SQLite from 1.4 and SQL Server has no row values"""
+    if dialect.name == 'mssql':
+        return False
+    return dialect.name != 'sqlite' or hasattr(dialect, 'tuple_in_values')
+
+
+def primary_key_filter(model, keys, dialect):
+    """Matches the rows of `model` whose primary key is in `keys`, tuples
+    for a composite key, with a row value IN or an OR of ANDs on the
+    dialects without it"""
+    columns = list(inspect(model).primary_key)
+    keys = list(keys)
+    if len(columns) == 1:
+        return columns[0].in_(keys)
+    if supports_tuple_in(dialect):
+        return tuple_(*columns).in_(keys)
+    return or_(*(and_(*(c == v for c, v in zip(columns, key)))
+                 for key in keys))
+
+
+def _iter_selected_fields(selection_set, fragments=None):
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            yield selection
+        elif isinstance(selection, ast.InlineFragment):
+            yield from _iter_selected_fields(
+                selection.selection_set, fragments)
+        elif isinstance(selection, ast.FragmentSpread) and fragments:
+            fragment = fragments.get(selection.name.value)
+            if fragment is not None:
+                yield from _iter_selected_fields(
+                    fragment.selection_set, fragments)
+
+
+def get_selection_names(selection_set, fragments=None):
+    """Returns the names of the fields requested in a selection set,
+    following fragment spreads and inline fragments"""
+    return [f.name.value for f in
+            _iter_selected_fields(selection_set, fragments)]
+
+
+def get_selection_set(selection_set, name, fragments=None):
+    """Returns the selection set of the field `name` requested in a
+    selection set"""
+    for f in _iter_selected_fields(selection_set, fragments):
+        if f.name.value == name:
+            return f.selection_set
+    return None
+
+
+def get_context_value(context, key, factory=None):
+    """Returns the request scoped value stored under `key` in the GraphQL
+    context, creating it with `factory` when missing"""
+    if isinstance(context, dict):
+        value = context.get(key)
+    else:
+        value = getattr(context, key, None)
+    if value is None and factory is not None:
+        value = factory()
+        set_context_value(context, key, value)
+    return value
+
+
+def set_context_value(context, key, value):
+    if isinstance(context, dict):
+        context[key] = value
+    else:
+        setattr(context, key, value)